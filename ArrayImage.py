@@ -0,0 +1,77 @@
+"""
+Wraps numpy image arrays as QImages without copying the pixels.
+"""
+
+from PySide.QtGui import *
+
+import numpy as np
+
+# Grayscale color table for single channel images
+_GRAY_TABLE = [qRgb(i, i, i) for i in range(256)]
+
+class ArrayImage(QImage):
+    """
+    A QImage that reads its pixels straight out of a numpy array and keeps
+    that array alive for as long as the image exists.
+    """
+    def __init__(self, array, format):
+        height, width = array.shape[:2]
+        # pass the row stride so rows need not be 32 bit aligned
+        super(ArrayImage, self).__init__(array.data, width, height,
+                                         array.strides[0], format)
+        self._array = array
+
+class ArrayImageConverter(object):
+    """
+    Turns H x W, H x W x 3 (RGB) and H x W x 4 (RGBA) uint8 arrays into
+    QImages, copying only when the array's memory layout is not one Qt can
+    read directly. Any such copy goes to a buffer that is reused between
+    frames, so an image from toQImage is only valid until the next call.
+    """
+    def __init__(self):
+        self._scratch = None
+
+    def toQImage(self, array):
+        if array.ndim == 3 and array.shape[2] == 1:
+            array = array[:, :, 0]
+
+        if array.ndim == 2:
+            array = self._packed(array)
+            image = ArrayImage(array, QImage.Format_Indexed8)
+            image.setColorTable(_GRAY_TABLE)
+            return image
+
+        channels = array.shape[2]
+        if channels == 3:
+            return ArrayImage(self._packed(array), QImage.Format_RGB888)
+        if channels == 4:
+            # Qt 4 has no byte ordered RGBA format, ARGB32 is BGRA in memory
+            bgra = self._buffer(array.shape)
+            bgra[:, :, 0] = array[:, :, 2]
+            bgra[:, :, 1] = array[:, :, 1]
+            bgra[:, :, 2] = array[:, :, 0]
+            bgra[:, :, 3] = array[:, :, 3]
+            return ArrayImage(bgra, QImage.Format_ARGB32)
+        raise ValueError("Can not display images with %d channels" % channels)
+
+    def _packed(self, array):
+        # Qt needs a 32 bit aligned start and the pixels of a row next to
+        # each other, rows themselves may be any distance apart
+        pixelStrides = array.strides[1:]
+        itemsize = array.dtype.itemsize
+        contiguous = (array.dtype == np.uint8 and
+                      pixelStrides[-1] == itemsize and
+                      (len(pixelStrides) == 1 or
+                       pixelStrides[0] == array.shape[2] * itemsize) and
+                      array.strides[0] > 0 and
+                      array.ctypes.data % 4 == 0)
+        if contiguous:
+            return array
+        packed = self._buffer(array.shape)
+        np.copyto(packed, array, casting='unsafe')
+        return packed
+
+    def _buffer(self, shape):
+        if self._scratch is None or self._scratch.shape != shape:
+            self._scratch = np.empty(shape, np.uint8)
+        return self._scratch
@@ -1,42 +1,55 @@
-
 #!/usr/bin/python
 
+import os
+import sys
+import time
+
+startTime = time.time()
+
 # Import PySide classes
 from PySide.QtCore import *
 from PySide.QtGui import *
-from PySide.QtUiTools import *
 
-# import Python Image Library
-import PIL.ImageFile
+import Instrumentation
 
-# Import cinema IO
-from cinema_python import cinema_store
+tracer = Instrumentation.getTracer()
+tracer.record('startup.imports', startTime, time.time())
 
-import sys
-import json
-
-#open up a store
-with open(sys.argv[1], mode="rb") as file:
-    info_json = json.load(file)
-storeType = "MFS"
-try:
-    if info_json["metadata"]["store_type"] == "SFS":
-        cs = cinema_store.SingleFileStore(sys.argv[1])
-    else:
-        raise TypeError
-except(TypeError,KeyError):
-    cs = cinema_store.FileStore(sys.argv[1])
-
-cs.load()
+# Report the startup phases on stderr when CINEMA_STARTUP_TIMES is set
+def reportStartup():
+    if not os.environ.get('CINEMA_STARTUP_TIMES'):
+        return
+    for stage in ['startup.imports', 'startup.window', 'startup.open',
+                  'startup.widgets', 'startup.firstFrame',
+                  'startup.deferredWidgets']:
+        duration = tracer.latest(stage)
+        if duration is not None:
+            sys.stderr.write('%-24s %8.1f ms\n' % (stage, duration * 1000))
+    sys.stderr.write('%-24s %8.1f ms\n' % ('total', (time.time() - startTime) * 1000))
 
 # Show it in Qt
 app = QApplication(sys.argv)
 
-# set up UI
-from MainWindow import *
-mainWindow = MainWindow()
-mainWindow.setStore(cs)
-mainWindow.show()
+# set up UI, showing the window before the store is read
+with tracer.stage('startup.window'):
+    from MainWindow import *
+    mainWindow = MainWindow()
+    mainWindow.show()
+    app.processEvents()
+
+#open up the stores, several are shown side by side
+with tracer.stage('startup.open'):
+    import StoreLoader
+    import ProcessDecoder
+    stores = []
+    for filename in sys.argv[1:]:
+        cs = StoreLoader.openStore(filename)
+        # decode in worker processes if CINEMA_DECODE_PROCESSES asks for it
+        ProcessDecoder.attach(cs, filename)
+        stores.append(cs)
+
+mainWindow.firstFrameShown.connect(reportStartup)
+mainWindow.setStores(stores)
 
 # Enter Qt application main loop
 app.exec_()
@@ -0,0 +1,211 @@
+#!/usr/bin/python
+"""
+Render frames of a store to image files or a raw video stream, without
+the GUI.
+
+usage: python CinemaBatch.py PATH/info.json OUTPUT [--sweep time,phi]
+           [--set theta=30] [--set layer=a,b] [--format png|raw]
+           [--colormap NAME]
+
+Parameters start at their defaults, as in the viewer. --set chooses other
+values, several for option parameters, and every combination of the
+values of the --sweep parameters is rendered, in order. png writes one
+file per frame into the directory OUTPUT, raw writes 8 bit RGB frames
+back to back to the file OUTPUT, or to stdout for '-', e.g.
+
+    python CinemaBatch.py info.json - --sweep time --format raw | \\
+        ffmpeg -f rawvideo -pix_fmt rgb24 -s WxH -i - movie.mp4
+
+with the frame size CinemaBatch.py prints. Value fields are shown with
+the --colormap colormap.
+"""
+
+import argparse
+import collections
+import io
+import itertools
+import multiprocessing
+import os
+import sys
+
+import numpy as np
+
+import FrameRenderer
+import LayerLoader
+import Shader
+import StoreIndex
+import StoreLoader
+
+# set in each worker process by _startWorker
+_renderer = None
+
+def makeQueries(store, sweep, settings):
+    """
+    Queries for every combination of the values of the sweep parameters,
+    with the others at their defaults unless settings (parameter name to
+    list of values) says otherwise.
+    """
+    pl = store.parameter_list
+    base = {}
+    for name in pl:
+        base[name] = frozenset(settings.get(name, [pl[name]['default']]))
+    queries = []
+    for values in itertools.product(*[pl[name]['values'] for name in sweep]):
+        query = dict(base)
+        for name, value in zip(sweep, values):
+            query[name] = frozenset([value])
+        queries.append(query)
+    return queries
+
+def parseSetting(store, setting):
+    """ turn 'name=v1,v2' into (name, [values]) using the store's values """
+    name, ignored, text = setting.partition('=')
+    if name not in store.parameter_list:
+        raise ValueError("The store has no parameter %s" % name)
+    byText = dict((str(v), v) for v in store.parameter_list[name]['values'])
+    values = []
+    for t in text.split(','):
+        if t not in byText:
+            raise ValueError("%s is not a value of %s" % (t, name))
+        values.append(byText[t])
+    return name, values
+
+def toRGB(frame):
+    """ 8 bit H x W x 3 version of a frame """
+    if frame.ndim == 2:
+        frame = frame[:, :, np.newaxis]
+    if frame.shape[2] == 1:
+        frame = np.repeat(frame, 3, axis=2)
+    return np.ascontiguousarray(frame[:, :, :3], dtype=np.uint8)
+
+def encode(frame, format):
+    if format == 'raw':
+        return toRGB(frame).tobytes()
+    import PIL.Image
+    if format == 'jpeg':
+        # no alpha in JPEG
+        frame = toRGB(frame)
+    data = io.BytesIO()
+    PIL.Image.fromarray(np.ascontiguousarray(frame)).save(data, format.upper())
+    return data.getvalue()
+
+def _startWorker(filename, colormap):
+    global _renderer
+    Shader.setColormap(colormap)
+    store = StoreLoader.openStore(filename)
+    StoreIndex.buildIndex(store).join()
+    # one process per core already, so load one image at a time
+    _renderer = FrameRenderer.FrameRenderer(store, LayerLoader.LayerLoader(serial=True))
+
+def _renderFrame(job):
+    query, format = job
+    frame = _renderer.render(query)
+    if frame is None:
+        return None
+    return frame.shape[1], frame.shape[0], encode(frame, format)
+
+def renderFrames(filename, queries, format, processes, maxInFlight,
+                 colormap=Shader.DEFAULT_COLORMAP):
+    """
+    Generate (width, height, encoded frame) for each query, or None for
+    queries with nothing to show, in the order of queries. At most
+    maxInFlight frames are rendered or waiting to be written at a time.
+    """
+    jobs = [(query, format) for query in queries]
+    if processes == 1:
+        _startWorker(filename, colormap)
+        for job in jobs:
+            yield _renderFrame(job)
+        return
+
+    pool = multiprocessing.Pool(processes, _startWorker, (filename, colormap))
+    try:
+        pending = collections.deque()
+        jobs = iter(jobs)
+        for job in itertools.islice(jobs, maxInFlight):
+            pending.append(pool.apply_async(_renderFrame, (job,)))
+        while pending:
+            result = pending.popleft().get()
+            for job in itertools.islice(jobs, 1):
+                pending.append(pool.apply_async(_renderFrame, (job,)))
+            yield result
+        pool.close()
+    finally:
+        pool.terminate()
+        pool.join()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('store', help='info.json of the store')
+    parser.add_argument('output', help="directory for png, file or '-' for raw")
+    parser.add_argument('--sweep', default='',
+                        help='comma separated parameters to go through all values of')
+    parser.add_argument('--set', action='append', default=[], metavar='NAME=VALUES',
+                        help='comma separated values to use for a parameter')
+    parser.add_argument('--format', choices=['png', 'jpeg', 'raw'], default='png')
+    parser.add_argument('--pattern', default='frame_{index:06d}.{extension}',
+                        help='file names for png and jpeg, may use {index} and '
+                             'the value of any parameter (default %(default)s)')
+    parser.add_argument('--colormap', choices=list(Shader.COLORMAPS),
+                        default=Shader.DEFAULT_COLORMAP,
+                        help='for value fields (default %(default)s)')
+    parser.add_argument('--processes', type=int, default=multiprocessing.cpu_count())
+    parser.add_argument('--max-in-flight', type=int, default=None,
+                        help='frames held in memory at once (default twice --processes)')
+    args = parser.parse_args(argv)
+
+    store = StoreLoader.openStore(args.store)
+    sweep = [name for name in args.sweep.split(',') if name]
+    for name in sweep:
+        if name not in store.parameter_list:
+            parser.error("The store has no parameter %s" % name)
+    try:
+        settings = dict(parseSetting(store, s) for s in args.set)
+    except ValueError as e:
+        parser.error(str(e))
+    queries = makeQueries(store, sweep, settings)
+    maxInFlight = args.max_in_flight or 2 * args.processes
+
+    if args.format == 'raw':
+        if args.output == '-':
+            out = getattr(sys.stdout, 'buffer', sys.stdout)
+        else:
+            out = open(args.output, 'wb')
+    elif not os.path.exists(args.output):
+        os.makedirs(args.output)
+
+    size = None
+    count = 0
+    frames = renderFrames(args.store, queries, args.format, args.processes, maxInFlight,
+                          args.colormap)
+    for index, result in enumerate(frames):
+        if result is None:
+            sys.stderr.write('Nothing to show for frame %d\n' % index)
+            continue
+        width, height, data = result
+        if args.format == 'raw':
+            if size is None:
+                size = (width, height)
+                sys.stderr.write('Frames are %dx%d\n' % size)
+            elif size != (width, height):
+                raise ValueError("Frame %d is %dx%d, not %dx%d like the others" %
+                                 ((index, width, height) + size))
+            out.write(data)
+        else:
+            names = dict((name, next(iter(values)))
+                         for name, values in queries[index].items() if len(values) == 1)
+            names.update(index=index, extension=args.format)
+            filename = args.pattern.format(**names)
+            with open(os.path.join(args.output, filename), 'wb') as f:
+                f.write(data)
+        count += 1
+
+    if args.format == 'raw':
+        out.flush()
+        if out is not getattr(sys.stdout, 'buffer', sys.stdout):
+            out.close()
+    sys.stderr.write('%d frames written\n' % count)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,153 @@
+"""
+Depth composites the layers of a frame into a single color image.
+"""
+
+import numpy as np
+
+class Compositor(object):
+    def __init__(self):
+        self._color = None
+        self._depth = None
+        self._less = None
+        self._mask = None
+        # index of the layer each pixel came from
+        self._owner = None
+        # (color, depth) of each layer in the last composite, kept so that
+        # a frame with one layer more or less can be made from it
+        self._layers = []
+
+    def composite(self, colors, depths):
+        """
+        Combine per layer color images (H x W x channels) into one, picking
+        for each pixel the color of the layer with the nearest depth.
+        depths are the matching H x W or H x W x k depth images. Where layers
+        are equally near the earlier layer wins.
+
+        When the layers are those of the last call with one added or
+        removed, only the pixels that layer wins or owned are recomputed.
+
+        The result is written into a buffer that is reused by the next call,
+        copy it if it needs to outlive that.
+        """
+        layers = [(c, self._asPixels(d)) for c, d in zip(colors, depths)]
+        previous = self._layers
+        # only one depth component orders layers independently of the
+        # order they were added in
+        incremental = (previous and self._depth is not None and
+                       self._depth.shape[2] == 1 and
+                       layers[0][1].shape == self._depth.shape and
+                       layers[0][0].shape == self._color.shape and
+                       layers[0][0].dtype == self._color.dtype and
+                       layers[0][1].dtype == self._depth.dtype)
+        changed = self._difference(previous, layers) if incremental else None
+
+        if changed == 'same':
+            pass
+        elif changed is not None and len(layers) > len(previous):
+            self._add(layers, changed)
+        elif changed is not None and layers:
+            self._remove(layers, previous, changed)
+        else:
+            self._full(layers)
+        self._layers = layers
+        return self._color
+
+    def _full(self, layers):
+        c0, d0 = layers[0]
+        self._allocate(c0, d0)
+        color = self._color
+        depth = self._depth
+        less = self._less
+        mask = self._mask
+        owner = self._owner
+
+        np.copyto(color, c0)
+        np.copyto(depth, d0)
+        owner.fill(0)
+        for i, (cnext, dnext) in enumerate(layers[1:]):
+            # a pixel is taken if any of its depth components is nearer
+            np.less(dnext, depth, out=less)
+            np.any(less, axis=2, out=mask)
+            np.copyto(color, cnext, where=mask[:, :, np.newaxis])
+            np.copyto(depth, dnext, where=mask[:, :, np.newaxis])
+            np.copyto(owner, i + 1, where=mask)
+
+    def _add(self, layers, index):
+        # the new layer takes pixels it is nearer at, and ties with layers
+        # that come after it
+        color, depth = layers[index]
+        owner = self._owner
+        owner[owner >= index] += 1
+        nearer = depth[:, :, 0] < self._depth[:, :, 0]
+        tied = (depth[:, :, 0] == self._depth[:, :, 0]) & (owner > index)
+        mask = nearer | tied
+        np.copyto(self._color, color, where=mask[:, :, np.newaxis])
+        np.copyto(self._depth, depth, where=mask[:, :, np.newaxis])
+        np.copyto(owner, index, where=mask)
+
+    def _remove(self, layers, previous, index):
+        # pick new owners for the pixels of the removed layer only
+        owner = self._owner
+        ys, xs = np.nonzero(owner == index)
+        owner[owner > index] -= 1
+        if len(ys) == 0:
+            return
+        best = layers[0][1][ys, xs, 0]
+        bestOwner = np.zeros(len(ys), owner.dtype)
+        for i, (color, depth) in enumerate(layers[1:]):
+            candidate = depth[ys, xs, 0]
+            nearer = candidate < best
+            best = np.where(nearer, candidate, best)
+            bestOwner[nearer] = i + 1
+        for i, (color, depth) in enumerate(layers):
+            taken = bestOwner == i
+            self._color[ys[taken], xs[taken]] = color[ys[taken], xs[taken]]
+        self._depth[ys, xs, 0] = best
+        owner[ys, xs] = bestOwner
+
+    def _difference(self, previous, layers):
+        """
+        'same' when layers are the previous ones, the index of the layer
+        added or removed when that is the only change, otherwise None
+        """
+        if len(layers) == len(previous):
+            if all(self._isSame(a, b) for a, b in zip(previous, layers)):
+                return 'same'
+            return None
+        if abs(len(layers) - len(previous)) != 1:
+            return None
+        shorter, longer = sorted([previous, layers], key=len)
+        index = 0
+        while index < len(shorter) and self._isSame(shorter[index], longer[index]):
+            index += 1
+        if all(self._isSame(a, b) for a, b in zip(shorter[index:], longer[index + 1:])):
+            return index
+        return None
+
+    def _isSame(self, a, b):
+        # the same pixels, even when they come as different array objects;
+        # previous layers are kept alive so their memory is not reused
+        return all(self._where(x) == self._where(y) for x, y in zip(a, b))
+
+    def _where(self, array):
+        return (array.ctypes.data, array.shape, array.strides, array.dtype.str)
+
+    def _asPixels(self, depth):
+        # treat single channel depth as H x W x 1 so all depths look alike
+        if depth.ndim == 2:
+            return depth[:, :, np.newaxis]
+        return depth
+
+    def _allocate(self, color, depth):
+        # only reallocate when the image size or type changes
+        if (self._color is None or
+            self._color.shape != color.shape or
+            self._color.dtype != color.dtype):
+            self._color = np.empty(color.shape, color.dtype)
+        if (self._depth is None or
+            self._depth.shape != depth.shape or
+            self._depth.dtype != depth.dtype):
+            self._depth = np.empty(depth.shape, depth.dtype)
+            self._less = np.empty(depth.shape, np.bool_)
+            self._mask = np.empty(depth.shape[:2], np.bool_)
+            self._owner = np.empty(depth.shape[:2], np.int16)
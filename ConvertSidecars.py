@@ -0,0 +1,39 @@
+#!/usr/bin/python
+"""
+Write uncompressed, memory mappable copies of a store's depth and value
+fields next to it, and reduced resolution copies of all of its fields for
+previews, see Sidecars.py.
+
+usage: python ConvertSidecars.py PATH/info.json [--types Z,VALUE] [--preview-stride 2]
+"""
+
+import argparse
+import sys
+
+import Sidecars
+import StoreIndex
+import StoreLoader
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('store', help='info.json of the store')
+    parser.add_argument('--types', default=','.join(Sidecars.TYPES),
+                        help='image types to convert (default %(default)s)')
+    parser.add_argument('--preview-stride', type=int, default=Sidecars.PREVIEW_STRIDE,
+                        help='stride of the preview copies, 0 for none (default %(default)s)')
+    parser.add_argument('--quiet', action='store_true')
+    args = parser.parse_args(argv)
+
+    def progress(count, query):
+        if not args.quiet and count % 100 == 0:
+            sys.stderr.write('%d fields converted\n' % count)
+
+    store = StoreLoader.openStore(args.store)
+    count = Sidecars.convert(store, args.store, StoreIndex.find,
+                             types=args.types.split(','), progress=progress,
+                             previewStride=args.preview_stride)
+    sys.stderr.write('%d sidecars in %s\n' % (count, Sidecars.directoryFor(args.store)))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,77 @@
+"""
+Answers whether a parameter's dependencies are satisfied by the current
+choices, from a table compiled once from the store's parameter_associations.
+
+A parameter depends on others taking certain values, and on those
+parameters' own dependencies in turn. Flattening that into a single
+allowed set per parameter means a check costs one set intersection per
+parameter involved, rather than trying every combination of chosen values.
+"""
+
+class DependencyTable(object):
+    def __init__(self, store):
+        self._constraints = {}
+        self._dependents = {}
+        self._enabled = {}
+        associations = store.parameter_associations
+        for name in associations:
+            constraints = self._compile(name, associations, set())
+            self._constraints[name] = constraints
+            for param in constraints:
+                self._dependents.setdefault(param, set()).add(name)
+
+    def _compile(self, name, associations, visiting):
+        # allowed values for every parameter name depends on, directly or
+        # through its dependees, intersecting where the paths meet
+        if name in visiting:
+            raise ValueError("Circular dependency on %s" % name)
+        visiting.add(name)
+        constraints = {}
+        for dep, values in associations.get(name, {}).items():
+            self._restrict(constraints, dep, set(values))
+            for param, allowed in self._compile(dep, associations, visiting).items():
+                self._restrict(constraints, param, allowed)
+        visiting.discard(name)
+        return constraints
+
+    def _restrict(self, constraints, param, allowed):
+        if param in constraints:
+            constraints[param] = constraints[param] & allowed
+        else:
+            constraints[param] = set(allowed)
+
+    def getConstraints(self, name):
+        """ parameter name to allowed values, for everything name needs """
+        return self._constraints.get(name, {})
+
+    def isSatisfied(self, name, currentQuery):
+        """
+        True if some combination of the chosen values (currentQuery maps
+        names to sets of values) satisfies name's dependencies.
+        """
+        for param, allowed in self._constraints.get(name, {}).items():
+            chosen = currentQuery.get(param)
+            if not chosen or allowed.isdisjoint(chosen):
+                return False
+        return True
+
+    def update(self, currentQuery, changed=None):
+        """
+        Re-evaluate the parameters that depend on the changed parameter
+        names. Returns a dict of name to enabled state for those whose state
+        is new or different, or for every dependent parameter when changed
+        is None.
+        """
+        if changed is None:
+            names = self._constraints.keys()
+        else:
+            names = set()
+            for param in changed:
+                names.update(self._dependents.get(param, ()))
+        updates = {}
+        for name in names:
+            enabled = self.isSatisfied(name, currentQuery)
+            if changed is None or self._enabled.get(name) != enabled:
+                self._enabled[name] = enabled
+                updates[name] = enabled
+        return updates
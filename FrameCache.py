@@ -0,0 +1,23 @@
+"""
+Size bounded cache of finished display pixmaps, keyed by the full set of
+parameter choices that produced them, so going back to a frame that was
+shown before does not composite or convert it again.
+"""
+
+import os
+
+import LruCache
+
+# Default budget, overridable with the CINEMA_FRAME_CACHE_MB environment variable
+DEFAULT_MAX_BYTES = int(os.environ.get('CINEMA_FRAME_CACHE_MB', 256)) * 1024 * 1024
+
+class FrameCache(LruCache.LruCache):
+    """
+    An LruCache of QPixmaps. Keys come from key(store, query), where query
+    maps every parameter name to the set of its chosen values.
+    """
+    def __init__(self, maxBytes=DEFAULT_MAX_BYTES):
+        super(FrameCache, self).__init__(maxBytes)
+
+    def _sizeOf(self, value):
+        return value.width() * value.height() * value.depth() // 8
@@ -0,0 +1,167 @@
+"""
+Produces the composited image for a set of parameter choices, without
+involving any GUI. Used by the viewer and anything else that needs frames.
+"""
+
+import Compositor
+import Instrumentation
+import LayerLoader
+import LayerQuery
+import Shader
+
+class FrameRenderer(object):
+    def __init__(self, store, loader=None, plan=None):
+        self._store = store
+        # compiled once, building layers for a frame only walks the plan
+        self._plan = plan if plan is not None else LayerQuery.QueryPlan(store)
+        self._loader = loader if loader is not None else LayerLoader.LayerLoader()
+        self._compositor = Compositor.Compositor()
+        self._shader = Shader.Shader()
+        # colors shaded from values for the last frame, by where their
+        # pixels are. The images are kept with them so that memory is not
+        # reused. Shading again only what changed keeps the arrays of
+        # unchanged layers the same, so the compositor can tell those
+        # layers apart from changed ones
+        self._shaded = {}
+        self._tracer = Instrumentation.getTracer()
+
+    def getStore(self):
+        return self._store
+
+    def buildLayers(self, query):
+        """
+        The layers to render for query (parameter name to set of chosen
+        values), and whether the store has layers at all.
+        """
+        with self._tracer.stage('query'):
+            return self._plan.buildLayers(query)
+
+    def loadLayers(self, layers, stride=1):
+        """
+        load the images of every field of every layer, at 1/stride of their
+        resolution
+        """
+        with self._tracer.stage('load'):
+            self._loader.load(self._store, layers, stride)
+
+    def load(self, query, stride=1):
+        """ build the layers for query and load their images """
+        layers, hasLayer = self.buildLayers(query)
+        self.loadLayers(layers, stride)
+        return layers, hasLayer
+
+    def composite(self, layers, hasLayer, stride=1, region=None):
+        """
+        Combine loaded layers into one image, or None if there are none.
+        With a stride above 1 only every stride-th pixel of every stride-th
+        row is used, for a quick reduced resolution frame. region is an
+        (x, y, width, height) rectangle to composite instead of the whole
+        frame. Layers loaded at a reduced resolution can only be composited
+        at a multiple of the stride they were loaded at.
+        The result may be shared with the image cache or reused by the next
+        call, so do not modify it and copy it if it needs to be kept.
+        """
+        if len(layers) == 0:
+            return None
+        with self._tracer.stage('shade'):
+            colors = self._colors(layers, stride, region)
+        if hasLayer:
+            with self._tracer.stage('composite'):
+                return self._compositor.composite(
+                    colors, [self._crop(l.getDepth(), stride, region, l.stride)
+                             for l in layers])
+        return colors[0]
+
+    def render(self, query, stride=1):
+        """ load and composite in one go """
+        layers, hasLayer = self.load(query, stride)
+        return self.composite(layers, hasLayer, stride)
+
+    def frameSize(self, layers):
+        """
+        (width, height) of the frame made from layers, to within the stride
+        they were loaded at
+        """
+        layer = layers[0]
+        if layer.values:
+            image = layer.getValues1()
+        elif layer.colors:
+            image = layer.getColor1()
+        else:
+            image = layer.getLuminance()
+        height, width = image.shape[:2]
+        return width * layer.stride, height * layer.stride
+
+    def _colors(self, layers, stride, region):
+        # color images keep their channels, values are shaded to match
+        channels = 3
+        for l in layers:
+            if l.colors and l.getColor1().ndim == 3:
+                channels = max(channels, l.getColor1().shape[2])
+        colormap = Shader.getColormap()
+        shaded = {}
+        colors = []
+        for l in layers:
+            if l.values:
+                colors.append(self._shade(l, stride, region, channels, colormap,
+                                          shaded))
+            elif l.colors:
+                colors.append(self._crop(l.getColor1(), stride, region, l.stride))
+            else:
+                colors.append(self._crop(l.getLuminance(), stride, region, l.stride))
+        self._shaded = shaded
+        return colors
+
+    def _shade(self, layer, stride, region, channels, colormap, shaded):
+        values = layer.getValues1()
+        valuesAt = self._where(values)
+        valueRange = self._valueRange(layer)
+        if valueRange is None:
+            # of the whole full resolution image, so that tiles and
+            # previews agree with the refined frame
+            valueRange = self._loader.getCache().valueRange(
+                self._store, layer.getQuery('VALUE'))
+        luminance = layer.getLuminance()
+        key = (valuesAt, self._where(luminance), region, stride, channels,
+               colormap.name, valueRange)
+        if key in self._shaded:
+            color = self._shaded[key][2]
+        else:
+            cropped = None
+            if luminance is not None:
+                cropped = self._crop(luminance, stride, region, layer.stride)
+            croppedValues = self._crop(values, stride, region, layer.stride)
+            color = self._shader.shade(croppedValues, cropped, valueRange,
+                                       colormap, channels)
+        shaded[key] = (values, luminance, color)
+        return color
+
+    def _valueRange(self, layer):
+        # the range the store gives for the field, if it does
+        field = layer.getField('VALUE')
+        if field is None:
+            return None
+        name, value = field
+        ranges = self._store.parameter_list.get(name, {}).get('valueRanges', {})
+        valueRange = ranges.get(value)
+        if valueRange is None:
+            return None
+        return tuple(valueRange)
+
+    def _where(self, image):
+        if image is None:
+            return None
+        return (image.ctypes.data, image.shape, image.strides, image.dtype.str)
+
+    def _crop(self, image, stride, region, loadedStride=1):
+        # region is in full resolution pixels, image may hold only every
+        # loadedStride-th of them already
+        if region is not None:
+            x, y, width, height = region
+            s = loadedStride
+            image = image[y // s:(y + height + s - 1) // s,
+                          x // s:(x + width + s - 1) // s]
+        step = max(1, stride // loadedStride)
+        if step != 1:
+            image = image[::step, ::step]
+        return image
@@ -0,0 +1,244 @@
+"""
+Reads a cinema store served over HTTP.
+
+Give the viewer the URL of the store's info.json instead of a path. Files
+are fetched as they are needed over a few keep-alive connections to the
+server, and kept in a mirror of the store on local disk, so each is only
+downloaded once. info.json and the index of a packed store are fetched
+again every time the store is opened, delete the mirror if images change
+on the server. The mirror is under CINEMA_HTTP_CACHE, ~/.cache/cinema-viewer/http
+by default.
+
+The images of a frame are loaded by several threads at once (see
+LayerLoader), which share the connections. Packed stores are read with
+range requests for just the bytes of each file, or, from servers that do
+not support those, by downloading whole containers into the mirror.
+
+Any web server will do, e.g. for a store in the directory STORE
+    cd STORE && python -m http.server 8000
+    python Cinema.py http://localhost:8000/info.json
+"""
+
+import os
+import re
+import socket
+import tempfile
+import threading
+
+try:
+    import http.client as httplib
+    from urllib.parse import quote, urlsplit
+except ImportError:
+    import httplib
+    from urllib import quote
+    from urlparse import urlsplit
+
+from cinema_python import cinema_store
+
+import Instrumentation
+import PackedStore
+
+CACHE_DIRECTORY = os.environ.get(
+    'CINEMA_HTTP_CACHE',
+    os.path.join(os.path.expanduser('~'), '.cache', 'cinema-viewer', 'http'))
+# Connections kept open to one server
+CONNECTIONS = int(os.environ.get('CINEMA_HTTP_CONNECTIONS', 8))
+TIMEOUT = 30
+
+_URL = re.compile(r'^https?://', re.IGNORECASE)
+
+def isUrl(filename):
+    return _URL.match(filename) is not None
+
+class ConnectionPool(object):
+    """ keep-alive connections to one server, shared between threads """
+    def __init__(self, scheme, netloc, size=CONNECTIONS, timeout=TIMEOUT):
+        if scheme == 'https':
+            self._connectionClass = httplib.HTTPSConnection
+        else:
+            self._connectionClass = httplib.HTTPConnection
+        self._netloc = netloc
+        self._timeout = timeout
+        self._idle = []
+        self._lock = threading.Lock()
+        self._available = threading.BoundedSemaphore(size)
+
+    def request(self, path, headers=None):
+        """ GET path, returns the response status and body """
+        headers = headers or {}
+        with self._available:
+            with self._lock:
+                connection = self._idle.pop() if self._idle else None
+            if connection is not None:
+                try:
+                    return self._send(connection, path, headers)
+                except (httplib.HTTPException, socket.error):
+                    # the server closed it while it was idle
+                    pass
+            return self._send(self._connect(), path, headers)
+
+    def _connect(self):
+        return self._connectionClass(self._netloc, timeout=self._timeout)
+
+    def _send(self, connection, path, headers):
+        try:
+            connection.request('GET', path, headers=headers)
+            response = connection.getresponse()
+            body = response.read()
+        except Exception:
+            connection.close()
+            raise
+        if response.will_close:
+            connection.close()
+        else:
+            with self._lock:
+                self._idle.append(connection)
+        return response.status, body
+
+    def close(self):
+        with self._lock:
+            for connection in self._idle:
+                connection.close()
+            self._idle = []
+
+def mirrorFor(url, cacheDirectory=CACHE_DIRECTORY):
+    """ the local directory that mirrors the store whose info.json is at url """
+    parts = urlsplit(url)
+    names = [parts.netloc.replace(':', '_')]
+    names.extend(n for n in parts.path.split('/')[:-1] if n and n != '..')
+    return os.path.join(cacheDirectory, *names)
+
+class RemoteStore(object):
+    """ The files of a store on a server, and their mirror on local disk """
+    def __init__(self, url, cacheDirectory=CACHE_DIRECTORY):
+        parts = urlsplit(url)
+        self._base = parts.path[:parts.path.rfind('/') + 1]
+        self._infoName = parts.path[len(self._base):] or 'info.json'
+        self._pool = ConnectionPool(parts.scheme.lower(), parts.netloc)
+        self._mirror = mirrorFor(url, cacheDirectory)
+        self._tracer = Instrumentation.getTracer()
+
+    def getMirror(self):
+        return self._mirror
+
+    def fetchInfo(self):
+        """ download info.json, returns where it is in the mirror """
+        return self.fetch(self._infoName, refresh=True)
+
+    def fetch(self, name, refresh=False):
+        """
+        The local path of the file name (relative to the store), downloaded
+        unless it is already in the mirror
+        """
+        filename = self.localPath(name)
+        if refresh or not os.path.exists(filename):
+            self.save(name, self.get(name))
+        return filename
+
+    def get(self, name, offset=None, length=None):
+        """
+        The contents of the file name, or length bytes of it from offset.
+        Returns (contents, True) when the server sent only those bytes,
+        (whole file, False) when it sent all of it.
+        """
+        headers = {}
+        if offset is not None:
+            headers['Range'] = 'bytes=%d-%d' % (offset, offset + length - 1)
+        with self._tracer.stage('http'):
+            status, body = self._pool.request(self.urlPath(name), headers)
+        if offset is not None:
+            if status == 206:
+                return body, True
+            if status == 200:
+                return body, False
+        elif status == 200:
+            return body
+        raise IOError("HTTP %d fetching %s" % (status, name))
+
+    def urlPath(self, name):
+        return quote(self._base + name)
+
+    def localPath(self, name):
+        parts = [n for n in name.split('/') if n and n != '..']
+        return os.path.join(self._mirror, *parts)
+
+    def openContainer(self, name):
+        """ a reader for the container called name of a packed store """
+        return RangeReader(self, PackedStore.DIRECTORY + '/' + name)
+
+    def packedArchive(self):
+        """ the PackedArchive of a packed store, reading over HTTP """
+        self.fetch(PackedStore.DIRECTORY + '/' + PackedStore.INDEX, refresh=True)
+        return PackedStore.PackedArchive(
+            os.path.join(self._mirror, PackedStore.DIRECTORY), self.openContainer)
+
+    def save(self, name, contents):
+        """ put contents in the mirror as the file name, returns its path """
+        # write next to it and move into place, so that other threads and
+        # processes never see part of a file
+        filename = self.localPath(name)
+        directory = os.path.dirname(filename)
+        if not os.path.isdir(directory):
+            try:
+                os.makedirs(directory)
+            except OSError:
+                if not os.path.isdir(directory):
+                    raise
+        handle, scratch = tempfile.mkstemp(dir=directory, suffix='.part')
+        try:
+            with os.fdopen(handle, 'wb') as f:
+                f.write(contents)
+            if os.name == 'nt' and os.path.exists(filename):
+                os.remove(filename)
+            os.rename(scratch, filename)
+        except Exception:
+            if os.path.exists(scratch):
+                os.remove(scratch)
+            raise
+        return filename
+
+    def close(self):
+        self._pool.close()
+
+class RangeReader(object):
+    """ positional reads from a container on the server, see PackedArchive """
+    def __init__(self, remote, name):
+        self._remote = remote
+        self._name = name
+        self._local = None
+        self._lock = threading.Lock()
+        filename = remote.localPath(name)
+        if os.path.exists(filename):
+            self._local = PackedStore.FileReader(filename)
+
+    def readAt(self, offset, length):
+        if self._local is not None:
+            return self._local.readAt(offset, length)
+        if not length:
+            return b''
+        contents, partial = self._remote.get(self._name, offset, length)
+        if partial:
+            return contents
+        # the server ignores ranges, keep the whole container
+        with self._lock:
+            if self._local is None:
+                self._local = PackedStore.FileReader(self._remote.save(self._name, contents))
+        return contents[offset:offset + length]
+
+    def close(self):
+        if self._local is not None:
+            self._local.close()
+
+class HttpStore(cinema_store.FileStore):
+    """
+    A FileStore read from the local mirror of a RemoteStore, which files are
+    downloaded into as they are loaded
+    """
+    def __init__(self, dbfilename, remote):
+        super(HttpStore, self).__init__(dbfilename)
+        self._remote = remote
+        self._root = remote.getMirror()
+
+    def _load_data(self, doc_file, descriptor):
+        self._remote.fetch(PackedStore.relativeName(self._root, doc_file))
+        return super(HttpStore, self)._load_data(doc_file, descriptor)
@@ -0,0 +1,169 @@
+"""
+Process-wide, size bounded cache of decoded field images.
+
+Images are keyed by the store they came from and the full field query that
+produced them, so that revisiting a frame does not go back to the store to
+find and decode the same files again. Reduced resolution copies used while
+interacting are kept under their own keys.
+"""
+
+import os
+import threading
+
+import numpy as np
+
+import Instrumentation
+import LruCache
+import ProcessDecoder
+import Shader
+import Sidecars
+import StoreIndex
+
+# Default budget, overridable with the CINEMA_CACHE_MB environment variable
+DEFAULT_MAX_BYTES = int(os.environ.get('CINEMA_CACHE_MB', 1024)) * 1024 * 1024
+
+class ImageCache(LruCache.LruCache):
+    def __init__(self, maxBytes=DEFAULT_MAX_BYTES):
+        super(ImageCache, self).__init__(maxBytes)
+        self._loading = {}
+        # (smallest, largest) of value images at full resolution, by key
+        self._valueRanges = {}
+        self.loadedBytes = 0
+
+    def key(self, store, query, stride=1):
+        """
+        make a hashable key for a field query made against a store, at
+        1/stride of its resolution
+        """
+        key = super(ImageCache, self).key(store, query)
+        if stride != 1:
+            return key + (stride,)
+        return key
+
+    def load(self, store, query, stride=1):
+        """
+        Return the decoded image for query, going to the store only when
+        it is not already cached. With a stride above 1 the image has every
+        stride-th pixel of every stride-th row. The result is shared, do
+        not modify it.
+        """
+        key = self.key(store, query, stride)
+        img = self.get(key)
+        if img is None:
+            img = self._fetch(key, store, query, stride)
+        return img
+
+    def valueRange(self, store, query):
+        """
+        The smallest and largest value in the full resolution image for
+        query, which reduced copies of it are shaded with too. Recorded by
+        the sidecars when there are some, otherwise the full image is
+        loaded to find it.
+        """
+        key = self.key(store, query)
+        with self._lock:
+            valueRange = self._valueRanges.get(key)
+        if valueRange is None:
+            valueRange = Sidecars.valueRange(store, query)
+            if valueRange is None:
+                valueRange = Shader.valueRange(self.load(store, query))
+            with self._lock:
+                self._valueRanges[key] = valueRange
+        return valueRange
+
+    def warm(self, store, query):
+        """
+        Make sure the image for query is cached, without counting it as a
+        hit or a miss. Used to load frames ahead of time.
+        """
+        key = self.key(store, query)
+        if not self.contains(key):
+            self._fetch(key, store, query)
+
+    def _fetch(self, key, store, query, stride=1):
+        # only one thread decodes a given image, others wait for it
+        with self._lock:
+            img = self._entries.get(key)
+            if img is not None:
+                return img
+            event = self._loading.get(key)
+            owner = event is None
+            if owner:
+                event = threading.Event()
+                self._loading[key] = event
+        if not owner:
+            event.wait()
+            with self._lock:
+                img = self._entries.get(key)
+            if img is not None:
+                return img
+            # the other load failed, or the image did not fit
+            return self._decode(store, query, stride)
+        try:
+            img = self._decode(store, query, stride)
+            self.put(key, img)
+        finally:
+            with self._lock:
+                del self._loading[key]
+            event.set()
+        return img
+
+    def _decode(self, store, query, stride=1):
+        if stride != 1:
+            return self._reduce(store, query, stride)
+        with Instrumentation.getTracer().stage('mmap'):
+            img = Sidecars.load(store, query)
+        if img is None:
+            img = ProcessDecoder.load(store, query)
+        if img is None:
+            img = StoreIndex.load(store, query)
+        self._freeze(img)
+        with self._lock:
+            self.loadedBytes += self._sizeOf(img)
+        return img
+
+    def _reduce(self, store, query, stride):
+        # the full image is only decoded when there is no reduced copy of
+        # it on disk and it is not cached already
+        full = self.key(store, query)
+        img = None
+        if not self.contains(full):
+            with Instrumentation.getTracer().stage('mmap'):
+                img = Sidecars.load(store, query, stride)
+        if img is None:
+            img = np.ascontiguousarray(self.load(store, query)[::stride, ::stride])
+        self._freeze(img)
+        return img
+
+    def clear(self):
+        with self._lock:
+            super(ImageCache, self).clear()
+            self._valueRanges.clear()
+
+    def stats(self):
+        """ summary of cache effectiveness and occupancy """
+        with self._lock:
+            stats = super(ImageCache, self).stats()
+            stats['loadedBytes'] = self.loadedBytes
+            return stats
+
+    def _sizeOf(self, value):
+        return getattr(value, 'nbytes', 0)
+
+    def _freeze(self, value):
+        # cached arrays are handed to every frame that uses them
+        try:
+            value.flags.writeable = False
+        except (AttributeError, ValueError):
+            pass
+
+_defaultCache = None
+_defaultCacheLock = threading.Lock()
+
+def getDefaultCache():
+    """ the cache shared by everything in this process """
+    global _defaultCache
+    with _defaultCacheLock:
+        if _defaultCache is None:
+            _defaultCache = ImageCache()
+        return _defaultCache
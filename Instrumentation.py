@@ -0,0 +1,101 @@
+"""
+Timing of the stages that go into a frame.
+
+Code wraps each stage in tracer.stage(name). The tracer keeps the latest
+duration of every stage for on-screen display, and while recording also
+keeps every event so a session can be exported in the Chrome trace format
+(load the file in chrome://tracing or https://ui.perfetto.dev).
+"""
+
+import collections
+import json
+import os
+import threading
+import time
+
+# Upper bound on recorded events, the oldest are dropped beyond it
+MAX_EVENTS = 1000000
+
+class _Stage(object):
+    __slots__ = ('_tracer', '_name', '_args', '_start')
+
+    def __init__(self, tracer, name, args):
+        self._tracer = tracer
+        self._name = name
+        self._args = args
+
+    def __enter__(self):
+        self._start = time.time()
+        return self
+
+    def __exit__(self, excType, excValue, tb):
+        self._tracer._record(self._name, self._start, time.time(), self._args)
+        return False
+
+class Tracer(object):
+    def __init__(self, maxEvents=MAX_EVENTS):
+        self._lock = threading.Lock()
+        self._recording = False
+        self._events = collections.deque(maxlen=maxEvents)
+        self._threadNames = {}
+        self._latest = {}
+        self._origin = time.time()
+
+    def stage(self, name, **args):
+        """ context manager that times the code it wraps as stage name """
+        return _Stage(self, name, args)
+
+    def setRecording(self, recording):
+        """ start or stop keeping events for exportChromeTrace """
+        with self._lock:
+            self._recording = recording
+
+    def isRecording(self):
+        return self._recording
+
+    def clear(self):
+        with self._lock:
+            self._events.clear()
+            self._threadNames.clear()
+
+    def latest(self, name):
+        """ duration in seconds of the last completed stage name, or None """
+        return self._latest.get(name)
+
+    def record(self, name, start, end, **args):
+        """ add a stage that was timed some other way, times from time.time """
+        self._record(name, start, end, args)
+
+    def _record(self, name, start, end, args):
+        self._latest[name] = end - start
+        if not self._recording:
+            return
+        thread = threading.current_thread()
+        with self._lock:
+            self._threadNames[thread.ident] = thread.name
+            self._events.append((name, start, end, thread.ident, args))
+
+    def exportChromeTrace(self, filename):
+        """ write the recorded events as a Chrome trace format JSON file """
+        pid = os.getpid()
+        with self._lock:
+            events = list(self._events)
+            threadNames = dict(self._threadNames)
+        trace = []
+        for tid, name in threadNames.items():
+            trace.append({'name': 'thread_name', 'ph': 'M', 'pid': pid,
+                          'tid': tid, 'args': {'name': name}})
+        for name, start, end, tid, args in events:
+            trace.append({'name': name, 'cat': 'cinema', 'ph': 'X',
+                          'ts': (start - self._origin) * 1e6,
+                          'dur': (end - start) * 1e6,
+                          'pid': pid, 'tid': tid, 'args': args})
+        with open(filename, 'w') as f:
+            json.dump({'traceEvents': trace, 'displayTimeUnit': 'ms'}, f)
+        return len(events)
+
+_tracer = Tracer()
+
+def getTracer():
+    """ the tracer shared by everything in this process """
+    return _tracer
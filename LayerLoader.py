@@ -0,0 +1,76 @@
+"""
+Loads the images for every field of every layer in a frame at once.
+"""
+
+import multiprocessing
+import multiprocessing.pool
+import os
+import threading
+
+import ImageCache
+
+# Set CINEMA_SERIAL_LOAD=1 to load one image at a time, e.g. for debugging
+SERIAL_DEFAULT = os.environ.get('CINEMA_SERIAL_LOAD', '0') not in ('', '0')
+
+class LayerLoader(object):
+    def __init__(self, numThreads=None, serial=SERIAL_DEFAULT, cache=None):
+        # decoding in PIL and zlib releases the GIL, so one thread per core
+        if numThreads is None:
+            try:
+                numThreads = multiprocessing.cpu_count()
+            except NotImplementedError:
+                numThreads = 4
+        self._numThreads = numThreads
+        self._serial = serial
+        self._cache = cache if cache is not None else ImageCache.getDefaultCache()
+        self._pool = None
+        self._lock = threading.Lock()
+
+    def setSerial(self, serial):
+        """ load images one after another on the calling thread """
+        self._serial = serial
+
+    def isSerial(self):
+        return self._serial
+
+    def getCache(self):
+        return self._cache
+
+    def load(self, store, layers, stride=1):
+        """
+        Load the images of all the given LayerSpecs, at 1/stride of their
+        resolution. Images are handed to each layer in the same order that
+        LayerSpec.loadImages would, no matter which finishes decoding first.
+        """
+        jobs = []
+        for layer in layers:
+            for img_type, query in layer.getQueries():
+                jobs.append((layer, img_type, query))
+
+        cache = self._cache
+        def _load(job):
+            return cache.load(store, job[2], stride)
+
+        if self._serial or len(jobs) < 2:
+            images = [_load(job) for job in jobs]
+        else:
+            images = self._getPool().map(_load, jobs)
+
+        for layer in layers:
+            layer.stride = stride
+        for job, img in zip(jobs, images):
+            layer, img_type, query = job
+            layer.addImage(img_type, img)
+
+    def close(self):
+        """ shut down the worker threads """
+        with self._lock:
+            if self._pool is not None:
+                self._pool.close()
+                self._pool = None
+
+    def _getPool(self):
+        with self._lock:
+            if self._pool is None:
+                self._pool = multiprocessing.pool.ThreadPool(self._numThreads)
+            return self._pool
@@ -0,0 +1,148 @@
+"""
+Translates a set of parameter choices into the layers that make up a frame.
+
+QueryPlan compiles the store's parameter structure once: which parameters
+are shared by every layer, which are layers and fields, what each depends
+on and what type of image each field value is. Building the layers for a
+frame then only walks that plan, without asking the store again.
+"""
+
+import itertools
+
+import DependencyTable
+import LayerSpec
+
+class _Parameter(object):
+    """ what the plan needs to know about a layer or field parameter """
+    __slots__ = ('constraints', 'isfield', 'dependers', 'fields')
+
+class QueryPlan(object):
+    def __init__(self, store, dependencyTable=None):
+        if dependencyTable is None:
+            dependencyTable = DependencyTable.DependencyTable(store)
+        dd = store.parameter_list
+        #parameters of static contents (e.g. current time and camera)
+        self._baseNames = []
+        #top level layer choices
+        self._topLayers = []
+        self._parameters = {}
+        self._values = dict((name, dd[name]['values']) for name in dd)
+        for name in dd.keys():
+            if (not store.isdepender(name) and not store.islayer(name)):
+                self._baseNames.append(name)
+                continue
+            if store.islayer(name) and not store.isdepender(name):
+                self._topLayers.append(name)
+            p = _Parameter()
+            p.constraints = [(param, frozenset(allowed)) for param, allowed in
+                             dependencyTable.getConstraints(name).items()]
+            p.isfield = store.isfield(name)
+            p.dependers = list(store.getdependers(name))
+            p.fields = []
+            if p.isfield:
+                types = dd[name].get('types')
+                for i, v in enumerate(dd[name]['values']):
+                    #depth is always needed to composite
+                    isDepth = types is not None and types[i] == 'depth'
+                    p.fields.append((v, store.determine_type({name: v}), isDepth))
+            self._parameters[name] = p
+
+    def buildLayers(self, currentQuery):
+        """
+        Translate GUI choices (a dict of parameter name to the set of chosen
+        values) into the LayerSpecs we need to render with.
+        Returns the list of layers and whether the store has layers at all.
+        """
+        base = LayerSpec.LayerSpec()
+        for name in self._baseNames:
+            #no options in query, so only 1 result not many
+            base.dict[name] = next(iter(currentQuery[name]))
+
+        #each layer query is composed of sequence of field queries, found by
+        #going depth first through the choices below each top level layer
+        layers = []
+        stack = [(name, base) for name in reversed(self._topLayers)]
+        while stack:
+            name, query = stack.pop()
+            p = self._parameters[name]
+            if not self._satisfied(p, query.dict):
+                continue
+
+            if p.isfield:
+                chosen = currentQuery[name]
+                #return currently selected color AND depth
+                #TODO: when we get more complicated GUI for color and shaders we'll return more
+                for v, img_type, isDepth in p.fields:
+                    if isDepth or v in chosen:
+                        query.addQuery(img_type, name, v)
+                layers.append(query)
+                continue
+
+            # dependers of a choice share its layer, in order
+            children = []
+            for v in currentQuery[name]:
+                lquery = query.copy()
+                lquery.dict[name] = v
+                for d in p.dependers:
+                    children.append((d, lquery))
+            stack.extend(reversed(children))
+
+        if not self._topLayers:
+            layers.append(base)
+
+        return layers, len(self._topLayers) > 0
+
+    def fieldQueries(self):
+        """
+        Generate every (image type, query) pair that buildLayers can
+        produce, over all values of all parameters, each once. Every
+        combination of the base parameters is walked through the layers
+        that it allows, and each field only adds its own values, so the
+        cost grows with the number of queries and not with the number of
+        combinations of field values.
+        """
+        values = [self._values[name] for name in self._baseNames]
+        for combination in itertools.product(*values):
+            base = dict(zip(self._baseNames, combination))
+            if not self._topLayers:
+                yield 'RGB', base
+                continue
+            stack = [(name, base) for name in reversed(self._topLayers)]
+            while stack:
+                name, query = stack.pop()
+                p = self._parameters[name]
+                if not self._satisfied(p, query):
+                    continue
+                if p.isfield:
+                    for v, img_type, isDepth in p.fields:
+                        fieldQuery = dict(query)
+                        fieldQuery[name] = v
+                        yield img_type, fieldQuery
+                    continue
+                children = []
+                for v in self._values[name]:
+                    lquery = dict(query)
+                    lquery[name] = v
+                    for d in p.dependers:
+                        children.append((d, lquery))
+                stack.extend(reversed(children))
+
+    def _satisfied(self, p, values):
+        for param, allowed in p.constraints:
+            if param not in values or values[param] not in allowed:
+                return False
+        return True
+
+def buildLayers(store, currentQuery):
+    """
+    The layers for currentQuery and whether the store has layers, see
+    QueryPlan.buildLayers. Compile a QueryPlan to build them repeatedly.
+    """
+    return QueryPlan(store).buildLayers(currentQuery)
+
+def allFieldQueries(store):
+    """
+    Generate every (image type, query) pair that buildLayers can produce
+    for store, over all values of all parameters.
+    """
+    return QueryPlan(store).fieldQueries()
@@ -2,9 +2,11 @@
 Manages the set of one or more fields that go into a layer.
 """
 
-import copy
+import ImageCache
 
 class LayerSpec(object):
+    __slots__ = ('depth', 'luminance', 'colors', 'values', 'dict', '_fields', 'stride')
+
     def __init__(self):
         self.depth = None
         self.luminance = None
@@ -12,6 +14,15 @@ class LayerSpec(object):
         self.values = []
         self.dict = {}
         self._fields = {}
+        # the images hold every stride-th pixel of every stride-th row
+        self.stride = 1
+
+    def copy(self):
+        """ a new layer with the same queries and no images """
+        other = LayerSpec()
+        other.dict = dict(self.dict)
+        other._fields = dict(self._fields)
+        return other
 
     def addToBaseQuery(self, query):
         """ add queries that together define the layer """
@@ -19,68 +30,83 @@ class LayerSpec(object):
 
     def addQuery(self, img_type, fieldname, fieldchoice):
         """ add a query for a particular field of the layer """
-        #print "ADDQUERY", img_type, fieldname, fieldchoice
         self._fields[img_type] = {fieldname:fieldchoice}
 
-    def loadImages(self, store):
+    def getQueries(self):
         """
-        Take the queries we've been given and get images for them.
-        Later call get* to get the images out.
+        The queries that loadImages will make, as a list of
+        (image type, query) pairs.
         """
         nfields = len(self._fields)
         if nfields == 0:
-            img = list(store.find(self.dict))[0].data
+            return [('RGB', self.dict)]
+        queries = []
+        for f in self._fields.keys():
+            query = dict(self.dict)
+            query.update(self._fields[f])
+            queries.append((f, query))
+        return queries
+
+    def getQuery(self, img_type):
+        """ the query loadImages makes for img_type, or None """
+        for f, query in self.getQueries():
+            if f == img_type:
+                return query
+        return None
+
+    def loadImages(self, store, cache=None, stride=1):
+        """
+        Take the queries we've been given and get images for them, at
+        1/stride of their resolution.
+        Later call get* to get the images out.
+        Images come from cache (the process-wide one by default) when
+        they have been loaded before.
+        """
+        if cache is None:
+            cache = ImageCache.getDefaultCache()
+        self.stride = stride
+        for f, query in self.getQueries():
+            img = cache.load(store, query, stride)
+            self.addImage(f, img)
+
+    def addImage(self, img_type, img):
+        """ file a loaded image according to what type of field it is """
+        if img_type == 'RGB':
             self._addColor(img)
-            #print "FALLBACK RGB"
-        else:
-            for f in self._fields.keys():
-                query = copy.deepcopy(self.dict)
-                query.update(self._fields[f])
-                #print f
-                #print "Q", query
-                img = list(store.find(query))[0].data
-                #print "I", img
-                if f == 'RGB':
-                    #print "ADD RGB"
-                    self._addColor(img)
-                elif f == 'Z':
-                    #print "ADD DEPTH"
-                    self._setDepth(img)
-                elif f == 'VALUE':
-                    #print "ADD VALUES"
-                    self._addColor(img) #TODO: change to addValues when renderer can handle
-                elif f == 'LUMINANCE':
-                    self._setLuminance(img)
+        elif img_type == 'Z':
+            self._setDepth(img)
+        elif img_type == 'VALUE':
+            self._addValues(img)
+        elif img_type == 'LUMINANCE':
+            self._setLuminance(img)
 
     def _setDepth(self, image):
         self.depth = image
-        #print "SETDEPTH"
-        #print image
-        #print self.depth
 
     def getDepth(self):
         return self.depth
 
     def _addColor(self, image):
         self.colors.append(image)
-        #print "ADDCOLOR"
-        #print image
-        #print self.colors
 
     def getColor1(self):
         return self.colors[0]
 
     def _addValues(self, image):
         self.values.append(image)
-        #print "ADDVALUE"
-        #print image
-        #print self.values
 
-    def getValues1(self, image):
-        return self.values[1]
+    def getValues1(self):
+        return self.values[0]
 
     def _setLuminance(self, image):
         self.luminance = image
 
-    def getLuminance(self, image):
+    def getLuminance(self):
         return self.luminance
+
+    def getField(self, img_type):
+        """ (field name, value) queried for img_type, or None """
+        field = self._fields.get(img_type)
+        if not field:
+            return None
+        return next(iter(field.items()))
@@ -0,0 +1,97 @@
+"""
+Size bounded, least recently used cache of things loaded from stores.
+
+Entries are keyed by the store they came from and the query that produced
+them. ImageCache keeps decoded field images in one, FrameCache finished
+frames. Subclasses say how big an entry is with _sizeOf.
+"""
+
+import collections
+import itertools
+import threading
+import weakref
+
+class LruCache(object):
+    def __init__(self, maxBytes):
+        self._maxBytes = maxBytes
+        self._bytes = 0
+        self._entries = collections.OrderedDict()
+        self._lock = threading.RLock()
+        self._storeTokens = weakref.WeakKeyDictionary()
+        self._nextToken = itertools.count()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def setMaxBytes(self, maxBytes):
+        """ change the memory budget, evicting as needed to fit in it """
+        with self._lock:
+            self._maxBytes = maxBytes
+            self._evict()
+
+    def getMaxBytes(self):
+        return self._maxBytes
+
+    def key(self, store, query):
+        """ make a hashable key for a query made against a store """
+        with self._lock:
+            token = self._storeTokens.get(store)
+            if token is None:
+                token = next(self._nextToken)
+                self._storeTokens[store] = token
+        return (token, tuple(sorted(query.items())))
+
+    def get(self, key):
+        """ return the cached value for key, or None if there isn't one """
+        with self._lock:
+            value = self._entries.pop(key, None)
+            if value is None:
+                self.misses += 1
+                return None
+            # reinsert to mark as most recently used
+            self._entries[key] = value
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        """ add a value to the cache, evicting least recently used ones """
+        size = self._sizeOf(value)
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= self._sizeOf(old)
+            if size > self._maxBytes:
+                # would evict everything else and still not fit
+                return
+            self._entries[key] = value
+            self._bytes += size
+            self._evict()
+
+    def contains(self, key):
+        """ check for an entry without touching counters or recency """
+        with self._lock:
+            return key in self._entries
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        """ summary of cache effectiveness and occupancy """
+        with self._lock:
+            return {'hits': self.hits,
+                    'misses': self.misses,
+                    'evictions': self.evictions,
+                    'entries': len(self._entries),
+                    'bytes': self._bytes,
+                    'maxBytes': self._maxBytes}
+
+    def _evict(self):
+        while self._bytes > self._maxBytes and self._entries:
+            key, value = self._entries.popitem(last=False)
+            self._bytes -= self._sizeOf(value)
+            self.evictions += 1
+
+    def _sizeOf(self, value):
+        raise NotImplementedError()
@@ -2,15 +2,25 @@ from PySide import QtCore
 from PySide.QtCore import *
 from PySide.QtGui import *
 
-import itertools
-import copy
-import numpy as np
-import PIL
-import LayerSpec
-from QRenderView import *
+import sys
+import time
+import LayerLoader
+import RenderPipeline
+import Prefetcher
+import PlaybackEngine
+import DependencyTable
+import ImageCache
+import FrameCache
+import Instrumentation
+import ProcessDecoder
+import Shader
+import StoreView
 from RenderViewMouseInteractor import *
 
 class MainWindow(QMainWindow):
+    # Emitted when the first frame of a store is shown
+    firstFrameShown = Signal()
+
     def __init__(self, parent=None):
         super(MainWindow, self).__init__()
 
@@ -21,14 +31,14 @@ class MainWindow(QMainWindow):
         self._mainWidget = QSplitter(Qt.Horizontal, self)
         self.setCentralWidget(self._mainWidget)
 
-        self._displayWidget = QRenderView(self)
-        self._displayWidget.setRenderHints(QPainter.SmoothPixmapTransform)
-        self._displayWidget.setAlignment(Qt.AlignCenter)
-        self._displayWidget.setSizePolicy(QSizePolicy.Ignored, QSizePolicy.Ignored)
+        # a view for each store, side by side
+        self._viewsWidget = QSplitter(Qt.Horizontal, self)
+        self._viewsWidget.setSizePolicy(QSizePolicy.Ignored, QSizePolicy.Ignored)
+        self._views = []
         self._parametersWidget = QWidget(self)
         self._parametersWidget.setMinimumSize(QSize(200, 100))
         self._parametersWidget.setSizePolicy(QSizePolicy.Preferred, QSizePolicy.MinimumExpanding)
-        self._mainWidget.addWidget(self._displayWidget)
+        self._mainWidget.addWidget(self._viewsWidget)
         self._mainWidget.addWidget(self._parametersWidget)
 
         layout = QVBoxLayout()
@@ -37,10 +47,43 @@ class MainWindow(QMainWindow):
         #keep track of widgets that depend on others for easy updating
         self._dependent_widgets = {}
 
+        #last position of each slider, to tell which way the user is going
+        self._sliderIndices = {}
+
+        #loads the images of all layers of a frame concurrently, for
+        #every store
+        self._loader = LayerLoader.LayerLoader()
+        #frames shown before, ready to show again
+        self._frameCache = FrameCache.FrameCache()
+        #replaces a reduced resolution frame once interaction pauses
+        self._refineTimer = QTimer(self)
+        self._refineTimer.setSingleShot(True)
+        self._refineTimer.setInterval(RenderPipeline.REFINE_DELAY_MS)
+        self._refineTimer.timeout.connect(self._refine)
+
+        #time spent on each stage of rendering
+        self._tracer = Instrumentation.getTracer()
+        self._requestTime = None
+        self._storeTime = None
+        self._lastCacheStats = ImageCache.getDefaultCache().stats()
+
+        #plays through range parameters
+        self._playback = PlaybackEngine.PlaybackEngine(self._loader, self)
+        self._playback.frameShown.connect(self._onPlaybackFrame)
+        self._playback.fpsUpdated.connect(self._onPlaybackFps)
+        self._playback.finished.connect(self._onPlaybackFinished)
+        self._playback.renderFailed.connect(self._onRenderFailed)
+
         self.createMenus()
 
         # Set up render view interactor
         self._mouseInteractor = RenderViewMouseInteractor()
+        # applies the input that came in since the last display refresh
+        self._cameraTimer = QTimer(self)
+        self._cameraTimer.setSingleShot(True)
+        self._cameraTimer.setInterval(UPDATE_INTERVAL_MS)
+        self._cameraTimer.timeout.connect(self._updateCamera)
+        self._appliedScale = 1
 
     # Create the menu bars
     def createMenus(self):
@@ -50,14 +93,110 @@ class MainWindow(QMainWindow):
         self._fileToolBar = self.menuBar().addMenu('&File')
         self._fileToolBar.addAction(self._exitAction)
 
+        # View menu
+        self._viewMenu = self.menuBar().addMenu('&View')
+        self._overlayAction = QAction('Performance &Overlay', self, checkable=True,
+                                      statusTip='Show frame timings over the image',
+                                      triggered=self.onOverlayToggled)
+        self._viewMenu.addAction(self._overlayAction)
+        self._tiledAction = QAction('&Tiled Display', self, checkable=True,
+                                    statusTip='Draw every frame in tiles, only where visible',
+                                    triggered=self.onTiledToggled)
+        self._viewMenu.addAction(self._tiledAction)
+        colormapMenu = self._viewMenu.addMenu('&Colormap')
+        colormapGroup = QActionGroup(self)
+        for name in Shader.COLORMAPS:
+            action = QAction(name, self, checkable=True)
+            action.setData(name)
+            action.setChecked(name == Shader.getColormap().name)
+            action.triggered.connect(self.onColormapChosen)
+            colormapGroup.addAction(action)
+            colormapMenu.addAction(action)
+        self._viewMenu.addSeparator()
+        self._recordTraceAction = QAction('&Record Trace', self, checkable=True,
+                                          statusTip='Record the timing of every rendering stage',
+                                          triggered=self.onRecordTraceToggled)
+        self._viewMenu.addAction(self._recordTraceAction)
+        self._exportTraceAction = QAction('&Export Trace...', self,
+                                          statusTip='Save recorded timings in Chrome trace format',
+                                          triggered=self.onExportTrace)
+        self._viewMenu.addAction(self._exportTraceAction)
+
+        # Playback menu
+        self._playbackMenu = self.menuBar().addMenu('&Playback')
+        fpsMenu = self._playbackMenu.addMenu('Frame &Rate')
+        fpsGroup = QActionGroup(self)
+        for fps in [1, 2, 5, 10, 15, 24, 30, 60]:
+            action = QAction('%d fps' % fps, self, checkable=True)
+            action.setData(fps)
+            action.setChecked(fps == self._playback.getTargetFps())
+            action.triggered.connect(self.onPlaybackFpsChosen)
+            fpsGroup.addAction(action)
+            fpsMenu.addAction(action)
+        self._playbackMenu.addSeparator()
+        modeGroup = QActionGroup(self)
+        for label, mode in [('Play &Once', PlaybackEngine.PlaybackEngine.ONCE),
+                            ('&Loop', PlaybackEngine.PlaybackEngine.LOOP),
+                            ('&Bounce', PlaybackEngine.PlaybackEngine.BOUNCE)]:
+            action = QAction(label, self, checkable=True)
+            action.setData(mode)
+            action.setChecked(mode == self._playback.getMode())
+            action.triggered.connect(self.onPlaybackModeChosen)
+            modeGroup.addAction(action)
+            self._playbackMenu.addAction(action)
+
     # Set the store currently being displayed
     def setStore(self, store):
+        self.setStores([store])
+
+    # Release the threads and processes that render frames
+    def closeEvent(self, event):
+        self._refineTimer.stop()
+        self._playback.shutdown()
+        for view in self._views:
+            view.stop()
+            ProcessDecoder.detach(view.getStore())
+        self._loader.close()
+        super(MainWindow, self).closeEvent(event)
+
+    # Set the stores to show side by side, which must have the same
+    # parameters and values. The first store's parameters make the GUI.
+    def setStores(self, stores):
+        store = stores[0]
+        for other in stores[1:]:
+            if not self._sameParameters(store, other):
+                raise ValueError("Stores with different parameters can not be compared")
+        self._storeTime = time.time()
+        self._playback.stop()
         self._store = store
         self._initializeCurrentQuery()
 
+        # Which widgets to enable for which choices
+        self._dependencyTable = DependencyTable.DependencyTable(store)
+        self._sliderIndices = {}
+
         # Disconnect all mouse signals in case the store has no phi or theta values
         self._disconnectMouseSignals()
 
+        # Render each store in the background, showing frames as they complete
+        for view in self._views:
+            view.stop()
+            if not any(view.getStore() is s for s in stores):
+                ProcessDecoder.detach(view.getStore())
+            view.getWidget().setParent(None)
+            view.getWidget().deleteLater()
+            # parented to the window, which would otherwise keep it
+            view.deleteLater()
+        self._views = []
+        for s in stores:
+            view = StoreView.StoreView(s, self._loader, self._frameCache, self,
+                                       self._dependencyTable if s is store else None)
+            view.setTiled(self._tiledAction.isChecked())
+            view.frameShown.connect(self._frameShown)
+            view.renderFailed.connect(self._onRenderFailed)
+            self._viewsWidget.addWidget(view.getWidget())
+            self._views.append(view)
+
         if ('phi' in store.parameter_list):
             self._mouseInteractor.setPhiValues(store.parameter_list['phi']['values'])
 
@@ -70,41 +209,52 @@ class MainWindow(QMainWindow):
         # Display the default image
         self.render()
         # Make the GUI
-        self._createParameterUI()
+        with self._tracer.stage('startup.widgets'):
+            self._createParameterUI()
 
     # Disconnect mouse signals
     def _disconnectMouseSignals(self):
-        try:
-            dw = self._displayWidget
-            dw.mousePressSignal.disconnect(self._initializeCamera)
-            dw.mousePressSignal.disconnect(self._mouseInteractor.onMousePress)
-            dw.mouseMoveSignal.disconnect(self._mouseInteractor.onMouseMove)
-            dw.mouseReleaseSignal.disconnect(self._mouseInteractor.onMouseRelease)
-            dw.mouseWheelSignal.disconnect(self._mouseInteractor.onMouseWheel)
+        for view in self._views:
+            try:
+                dw = view.getWidget()
+                dw.mousePressSignal.disconnect(self._initializeCamera)
+                dw.mousePressSignal.disconnect(self._mouseInteractor.onMousePress)
+                dw.mouseMoveSignal.disconnect(self._mouseInteractor.onMouseMove)
+                dw.mouseReleaseSignal.disconnect(self._mouseInteractor.onMouseRelease)
+                dw.mouseWheelSignal.disconnect(self._mouseInteractor.onMouseWheel)
+
+                # Update camera phi-theta if mouse is dragged
+                dw.mouseMoveSignal.disconnect(self._scheduleCameraUpdate)
+
+                # Update camera if mouse wheel is moved
+                dw.mouseWheelSignal.disconnect(self._scheduleCameraUpdate)
+            except:
+                # No big deal if we can't disconnect
+                pass
+
+    # Connect mouse signals, dragging in any view moves the camera of all
+    def _connectMouseSignals(self):
+        for view in self._views:
+            dw = view.getWidget()
+            dw.mousePressSignal.connect(self._initializeCamera)
+            dw.mousePressSignal.connect(self._mouseInteractor.onMousePress)
+            dw.mouseMoveSignal.connect(self._mouseInteractor.onMouseMove)
+            dw.mouseReleaseSignal.connect(self._mouseInteractor.onMouseRelease)
+            dw.mouseWheelSignal.connect(self._mouseInteractor.onMouseWheel)
 
             # Update camera phi-theta if mouse is dragged
-            self._displayWidget.mouseMoveSignal.disconnect(self._updateCamera)
+            dw.mouseMoveSignal.connect(self._scheduleCameraUpdate)
 
             # Update camera if mouse wheel is moved
-            self._displayWidget.mouseWheelSignal.disconnect(self._updateCamera)
-        except:
-            # No big deal if we can't disconnect
-            pass
-
-    # Connect mouse signals
-    def _connectMouseSignals(self):
-        dw = self._displayWidget
-        dw.mousePressSignal.connect(self._initializeCamera)
-        dw.mousePressSignal.connect(self._mouseInteractor.onMousePress)
-        dw.mouseMoveSignal.connect(self._mouseInteractor.onMouseMove)
-        dw.mouseReleaseSignal.connect(self._mouseInteractor.onMouseRelease)
-        dw.mouseWheelSignal.connect(self._mouseInteractor.onMouseWheel)
-
-        # Update camera phi-theta if mouse is dragged
-        self._displayWidget.mouseMoveSignal.connect(self._updateCamera)
+            dw.mouseWheelSignal.connect(self._scheduleCameraUpdate)
 
-        # Update camera if mouse wheel is moved
-        self._displayWidget.mouseWheelSignal.connect(self._updateCamera)
+    # Whether two stores have the same parameters with the same values
+    def _sameParameters(self, store, other):
+        pl = store.parameter_list
+        opl = other.parameter_list
+        if sorted(pl) != sorted(opl):
+            return False
+        return all(pl[name]['values'] == opl[name]['values'] for name in pl)
 
     # Initializes image store query.
     def _initializeCurrentQuery(self):
@@ -273,7 +423,6 @@ class MainWindow(QMainWindow):
     # Create property UI
     def _createParameterUI(self):
         keys = sorted(self._store.parameter_list)
-        dependencies = self._store.parameter_associations
 
         #reorder for clarity
         #these three are the most important
@@ -304,6 +453,29 @@ class MainWindow(QMainWindow):
             raise ValueError("Well that was unexpected")
         keys = keys2
 
+        # parameters that every frame uses get their widgets now, the
+        # layers and fields once the first frame is on its way
+        common = 0
+        while (common < len(keys) and
+               not self._store.isdepender(keys[common]) and
+               not self._store.isdependee(keys[common])):
+            common += 1
+        self._createParameterWidgets(keys[:common])
+        store = self._store
+        QTimer.singleShot(0, lambda: self._createDeferredWidgets(store, keys[common:]))
+
+    # Finish the property UI, unless the store changed in the meantime
+    def _createDeferredWidgets(self, store, keys):
+        if store is not self._store:
+            return
+        with self._tracer.stage('startup.deferredWidgets'):
+            self._createParameterWidgets(keys)
+            self._parametersWidget.layout().addStretch()
+            self._updateDependentWidgets()
+
+    # Create the widgets for the parameters keys, in that order
+    def _createParameterWidgets(self, keys):
+        dependencies = self._store.parameter_associations
         for name in keys:
             properties = self._store.parameter_list[name]
             widget = None
@@ -330,38 +502,27 @@ class MainWindow(QMainWindow):
                 widget.setEnabled(False)
                 self._dependent_widgets[name] = widget
 
-        self._parametersWidget.layout().addStretch()
-        self._updateDependentWidgets()
-
-    def _dependencies_satisfied(self, name):
-        #translate the sets we use for parameters of the query
-        #then call the same named method on the store
-        #TODO: using sets for everything to do options, but probably better if the store supported it
-        params = []
-        values = []
-        for n,vs in self._currentQuery.iteritems():
-            params.append(n)
-            values.append(vs)
-        for element in itertools.product(*values):
-            q = dict(itertools.izip(params, element))
-            if self._store.dependencies_satisfied(name, q):
-                return True
-        return False
-
-    # Update enable state of all dependent widgets
-    def _updateDependentWidgets(self):
-        for name, widget in self._dependent_widgets.iteritems():
-            if self._dependencies_satisfied(name):
-                widget.setEnabled(True)
-            else:
-                widget.setEnabled(False)
+    # Update enable state of dependent widgets, only those that depend on
+    # the changed parameters if given
+    def _updateDependentWidgets(self, changed=None):
+        updates = self._dependencyTable.update(self._currentQuery, changed)
+        for name, enabled in updates.items():
+            widget = self._dependent_widgets.get(name)
+            if widget is not None:
+                widget.setEnabled(enabled)
 
     # Respond to a slider movement
     def onSliderMoved(self):
         parameterName = self.sender().objectName()
         sliderIndex = self.sender().value()
         pl = self._store.parameter_list
+        if (self._playback.isPlaying() and
+            self._playback.getParameterName() == parameterName):
+            # the user took over the slider being played
+            self._playback.stop()
         value = pl[parameterName]['values'][sliderIndex]
+        step = sliderIndex - self._sliderIndices.get(parameterName, sliderIndex)
+        self._sliderIndices[parameterName] = sliderIndex
         s = set()
         s.add(value)
         self._currentQuery[parameterName] = s
@@ -369,8 +530,10 @@ class MainWindow(QMainWindow):
         valueLabel = self._parametersWidget.findChild(QLabel, parameterName + "ValueLabel")
         valueLabel.setText(self._formatText(value))
 
-        self._updateDependentWidgets()
-        self.render()
+        self._updateDependentWidgets([parameterName])
+        # while the slider is dragged show quick frames
+        self.render(preview=self.sender().isSliderDown())
+        self._prefetchNeighbours([(parameterName, sliderIndex, step)])
 
     # Respond to a combobox change
     def onChosen(self, index):
@@ -382,7 +545,7 @@ class MainWindow(QMainWindow):
         s.add(value)
         self._currentQuery[parameterName] = s
 
-        self._updateDependentWidgets()
+        self._updateDependentWidgets([parameterName])
         self.render()
 
     # Respond to a checkbox change
@@ -400,7 +563,7 @@ class MainWindow(QMainWindow):
 
         self._currentQuery[parameterName] = currentValues
 
-        self._updateDependentWidgets()
+        self._updateDependentWidgets([parameterName])
         self.render()
 
     # Back up slider all the way to the left
@@ -431,21 +594,58 @@ class MainWindow(QMainWindow):
     # Play forward through the parameters
     def onPlay(self):
         parameterName = self.sender().objectName().replace("PlayButton.", "")
-        timer = QTimer(self)
-        timer.setObjectName("Timer." + parameterName)
-        timer.setInterval(200)
-        timer.timeout.connect(self.onPlayTimer)
-        timer.start()
-
-    def onPlayTimer(self):
-        parameterName = self.sender().objectName().replace("Timer.", "")
+        if (self._playback.isPlaying() and
+            self._playback.getParameterName() == parameterName):
+            # a second click pauses
+            self._playback.stop()
+            return
 
         slider = self._parametersWidget.findChild(QSlider, parameterName)
-        maximum = slider.maximum()
-        if (slider.value() == slider.maximum()):
-            self.sender().stop()
-        else:
-            slider.setValue(maximum if slider.value() == maximum else slider.value() + 1)
+        # played frames are full resolution, nothing to refine
+        self._refineTimer.stop()
+        self._playback.start([view.getStore() for view in self._views], parameterName,
+                             slider.value(), self._snapshotQuery())
+        self._setPlayIcon(parameterName, QStyle.SP_MediaPause)
+
+    # Show the frames from the playback engine and move its slider along
+    def _onPlaybackFrame(self, parameterName, index, qimgs):
+        # the frame is already rendered, don't render it again
+        self._showSliderValue(parameterName, index)
+
+        value = self._store.parameter_list[parameterName]['values'][index]
+        s = set()
+        s.add(value)
+        self._currentQuery[parameterName] = s
+        self._updateDependentWidgets([parameterName])
+
+        query = self._snapshotQuery()
+        for view, qimg in zip(self._views, qimgs):
+            if qimg is not None:
+                pix = QPixmap.fromImage(qimg)
+                view.putFrame(query, pix)
+                view.showPixmap(pix)
+
+    def _onPlaybackFps(self, fps, dropped):
+        self.statusBar().showMessage('Playing %s at %.1f fps (target %d), %d frames dropped' %
+                                     (self._playback.getParameterName(), fps,
+                                      self._playback.getTargetFps(), dropped))
+
+    def _onPlaybackFinished(self):
+        self._setPlayIcon(self._playback.getParameterName(), QStyle.SP_MediaPlay)
+        self.statusBar().clearMessage()
+
+    def _setPlayIcon(self, parameterName, icon):
+        button = self._parametersWidget.findChild(QPushButton, "PlayButton." + parameterName)
+        if button is not None:
+            button.setIcon(self.style().standardIcon(icon))
+
+    # Respond to the playback frame rate menu
+    def onPlaybackFpsChosen(self):
+        self._playback.setTargetFps(self.sender().data())
+
+    # Respond to the playback mode menu
+    def onPlaybackModeChosen(self):
+        self._playback.setMode(self.sender().data())
 
     # Format string from number
     def _formatText(self, value):
@@ -463,134 +663,200 @@ class MainWindow(QMainWindow):
         slider = self._parametersWidget.findChild(QSlider, parameterName)
         slider.setValue(index)
 
+    # Move a slider and its label to index without rendering
+    def _showSliderValue(self, parameterName, index):
+        self._sliderIndices[parameterName] = index
+        slider = self._parametersWidget.findChild(QSlider, parameterName)
+        if slider is None:
+            return
+        slider.blockSignals(True)
+        slider.setValue(index)
+        slider.blockSignals(False)
+        value = self._store.parameter_list[parameterName]['values'][index]
+        valueLabel = self._parametersWidget.findChild(QLabel, parameterName + "ValueLabel")
+        valueLabel.setText(self._formatText(value))
+
     # Initialize the angles for the camera
     def _initializeCamera(self):
         self._mouseInteractor.setPhi(next(iter(self._currentQuery['phi'])))
         self._mouseInteractor.setTheta(next(iter(self._currentQuery['theta'])))
 
+    # Update the camera once the events of this display refresh are in
+    def _scheduleCameraUpdate(self):
+        if not self._cameraTimer.isActive():
+            self._cameraTimer.start()
+
     # Update the camera angle
     def _updateCamera(self):
         # Set the camera settings if available
         phi   = self._mouseInteractor.getPhi()
         theta = self._mouseInteractor.getTheta()
 
-        if ('phi' in self._currentQuery):
-            s = set()
-            s.add(phi)
-            self._currentQuery['phi']   = s
-
-        if ('theta' in self._currentQuery):
-            s = set()
-            s.add(theta)
-            self._currentQuery['theta'] = s
-
-        # Update the sliders for phi and theta
-        self._updateSlider('phi', phi)
-        self._updateSlider('theta', theta)
-
+        # Note which way the camera moved before updating the query
+        moves = []
+        pl = self._store.parameter_list
+        for name, value in (('phi', phi), ('theta', theta)):
+            if name in self._currentQuery:
+                old = next(iter(self._currentQuery[name]))
+                if old != value:
+                    values = pl[name]['values']
+                    index = values.index(value)
+                    moves.append((name, index, index - values.index(old)))
+                    s = set()
+                    s.add(value)
+                    self._currentQuery[name] = s
+                    # Update the slider without it rendering as well
+                    self._showSliderValue(name, index)
+
+        # zooming only transforms the frame that is already shown
         scale = self._mouseInteractor.getScale()
-        self._displayWidget.resetTransform()
-        self._displayWidget.scale(scale, scale)
-
-        self.render()
+        if scale != self._appliedScale:
+            self._appliedScale = scale
+            for view in self._views:
+                view.getWidget().resetTransform()
+                view.getWidget().scale(scale, scale)
+
+        if moves:
+            self._updateDependentWidgets([name for name, index, step in moves])
+            self.render(preview=self._mouseInteractor.isDragging())
+            self._prefetchNeighbours(moves)
+
+    # Copy of the current query that is safe to hand to other threads
+    def _snapshotQuery(self):
+        return dict((name, frozenset(values))
+                    for name, values in self._currentQuery.items())
+
+    # Load the frames around the current one in the background.
+    # moves is a list of (parameter name, index moved to, step taken).
+    def _prefetchNeighbours(self, moves):
+        pl = self._store.parameter_list
+        base = self._snapshotQuery()
+        queries = []
+        for name, index, step in moves:
+            values = pl[name]['values']
+            # camera angles wrap around, see RenderViewMouseInteractor
+            wrap = name in ('phi', 'theta')
+            if wrap and abs(step) > len(values) / 2:
+                step = -step
+            for i in Prefetcher.neighbourIndices(index, len(values), step, wrap=wrap):
+                query = dict(base)
+                query[name] = frozenset([values[i]])
+                queries.append(query)
+        for view in self._views:
+            view.prefetch(queries)
 
     # Perform query requested of the UI
     # retrieve documents that go into the result,
-    # display the retrieved image.
-    def render(self):
-        # translate GUI choices (self._currentQuery) into a set of queries
-        # that we need to render with
-
-        def _getfieldsfor(self, n):
-            param = self._store.parameter_list[n]
-            vals = param['values']
-            vals2 = []
-            #return currently selected color AND depth
-            #TODO: when we get more complicated GUI for color and shaders we'll return more
-            for v in vals:
-                if v in self._currentQuery[n]:
-                    vals2.append(v)
-                else:
-                    if 'types' in param:
-                        idx = param['values'].index(v)
-                        if param['types'][idx] == 'depth':
-                            vals2.append(v)
-            return vals2
-
-        def _buildqueryfor(self, n, query):
-            if not self._store.dependencies_satisfied(n, query.dict):
-                return
-
-            if self._store.isfield(n):
-                colorcomponents = _getfieldsfor(self, n)
-                for c in colorcomponents:
-                    img_type = self._store.determine_type({n:c})
-                    query.addQuery(img_type, n, c)
-                layers.append(query)
-                return
-
-            values = self._currentQuery[n]
-            dependers = self._store.getdependers(n)
-            for v in values:
-                lquery = copy.deepcopy(query)
-                lquery.addToBaseQuery({n:v})
-                for d in dependers:
-                    _buildqueryfor(self, d, lquery)
-
-        dd = self._store.parameter_list
+    # display the retrieved image, for every store.
+    # The work happens on the render pipelines' threads, only the newest
+    # request is rendered if several come in while one is busy.
+    # A preview is rendered at reduced resolution and refined once no
+    # other render has been asked for in a while.
+    # Frames that were shown before come straight from the frame cache.
+    def render(self, preview=False):
+        query = self._snapshotQuery()
+        if self._playback.isPlaying():
+            # the playback engine renders while it is running
+            self._playback.setQuery(query)
+            return
+        stride = 1
+        if preview:
+            stride = RenderPipeline.PREVIEW_STRIDE
+        self._requestTime = time.time()
+        # every store renders at once, each on its own pipeline
+        rendering = [view.render(query, stride) for view in self._views]
+        if preview and any(rendering):
+            self._refineTimer.start()
+        else:
+            self._refineTimer.stop()
+
+    # Replace a preview with the full resolution frame, unless playback has
+    # taken over rendering since, which setQuery would make drop frames
+    def _refine(self):
+        if not self._playback.isPlaying():
+            self.render()
+
+    def _frameShown(self):
+        if self._storeTime is not None:
+            # the first frame since the store was set
+            self._tracer.record('startup.firstFrame', self._storeTime, time.time())
+            self._storeTime = None
+            self.firstFrameShown.emit()
+        self._updateOverlay()
+
+    # Refresh the performance overlay after a frame is shown
+    def _updateOverlay(self):
+        stats = ImageCache.getDefaultCache().stats()
+        last = self._lastCacheStats
+        self._lastCacheStats = stats
+        if not self._overlayAction.isChecked():
+            return
 
-        #make query for static contents (e.g. current time and camera)
-        base_query = LayerSpec.LayerSpec()
-        potentials = []
-        for name in dd.keys():
-            if (not self._store.isdepender(name) and not self._store.islayer(name)):
-                values = self._currentQuery[name]
-                v = list(iter(values))[0] #no options in query, so only 1 result not many
-                base_query.addToBaseQuery({name:v})
-            else:
-                potentials.append(name)
-
-        #add to the above queries for all of the layers
-        #each layer query is composed of sequence of field queries
-        layers = []
-        hasLayer = False
-        for name in potentials:
-            if self._store.islayer(name) and not self._store.isdepender(name):
-                #name is a top level choice
-                hasLayer = True
-                _buildqueryfor(self, name, base_query) #recurse to find subchoices
-
-        if not hasLayer:
-            layers.append(base_query)
-
-        #send queries to the store to obtain images
-        for l in range(0,len(layers)):
-            layers[l].loadImages(self._store)
-
-        if len(layers) == 0:
-            self._displayWidget.setPixmap(None)
-            self._displayWidget.setAlignment(Qt.AlignCenter)
+        def ms(stage):
+            duration = self._tracer.latest(stage)
+            return '-' if duration is None else '%.1f' % (duration * 1000)
+
+        lines = []
+        if self._requestTime is not None:
+            lines.append('frame %s ms, %.1f ms since request' %
+                         (ms('frame'), (time.time() - self._requestTime) * 1000))
+        lines.append('query %s  load %s  shade %s  composite %s ms' %
+                     (ms('query'), ms('load'), ms('shade'), ms('composite')))
+        lines.append('qimage %s  pixmap %s  tile %s  paint %s ms' %
+                     (ms('qimage'), ms('pixmap'), ms('tile'), ms('paint')))
+        hits = stats['hits'] - last['hits']
+        lookups = hits + stats['misses'] - last['misses']
+        loaded = stats['loadedBytes'] - last['loadedBytes']
+        lines.append('cache %d/%d hits, %.1f MB loaded, %.0f MB held' %
+                     (hits, lookups, loaded / 1048576.0, stats['bytes'] / 1048576.0))
+        frames = self._frameCache.stats()
+        for view in self._views:
+            viewLines = list(lines)
+            if view.getShownStride() != 1:
+                viewLines.insert(1, 'preview at 1/%d resolution' % view.getShownStride())
+            viewLines.append('%s, %d frames cached in %.0f MB' %
+                             ('from frame cache' if view.isShowingCachedFrame() else 'rendered',
+                              frames['entries'], frames['bytes'] / 1048576.0))
+            view.getWidget().setOverlayText(viewLines)
+
+    # Respond to the performance overlay menu item
+    def onOverlayToggled(self, checked):
+        if checked:
+            self._updateOverlay()
+        else:
+            for view in self._views:
+                view.getWidget().setOverlayText([])
+
+    # Respond to the tiled display menu item, large frames are always tiled
+    def onTiledToggled(self, checked):
+        for view in self._views:
+            view.setTiled(checked)
+        if self._views:
+            self.render()
+
+    # Respond to the colormap menu, value fields are shaded again from the
+    # images already loaded
+    def onColormapChosen(self):
+        Shader.setColormap(self.sender().data())
+        self._frameCache.clear()
+        if self._views:
+            self.render()
+
+    # Respond to the record trace menu item
+    def onRecordTraceToggled(self, checked):
+        self._tracer.setRecording(checked)
+
+    # Save the recorded trace
+    def onExportTrace(self):
+        filename, ignored = QFileDialog.getSaveFileName(self, 'Export Trace',
+                                                        'cinema-trace.json',
+                                                        'Trace files (*.json)')
+        if not filename:
             return
+        count = self._tracer.exportChromeTrace(filename)
+        self.statusBar().showMessage('Saved %d events to %s' % (count, filename))
 
-        #render, by iterating through the layers, rendering each ontop and continuing
-        l0 = layers[0]
-        c0 = np.copy(l0.getColor1()) #TODO: apply frag shader to derive color from values
-        if hasLayer:
-            d0 = np.copy(l0.getDepth())
-            # composite in the rest of the layers, picking color of nearest pixel
-            for idx in range(1,len(layers)):
-                cnext = layers[idx].getColor1()
-                dnext = layers[idx].getDepth()
-                indxarray = np.where(dnext<d0)
-                c0[indxarray[0],indxarray[1],:] = cnext[indxarray[0],indxarray[1],:]
-                d0[indxarray[0],indxarray[1],:] = dnext[indxarray[0],indxarray[1],:]
-
-        # show the result
-        pimg = PIL.Image.fromarray(c0)
-        imageString = pimg.tostring('raw', 'RGB')
-        qimg = QImage(imageString, pimg.size[0], pimg.size[1], QImage.Format_RGB888)
-        pix = QPixmap.fromImage(qimg)
-
-        # Try to resize the display widget
-        self._displayWidget.sizeHint = pix.size
-        self._displayWidget.setPixmap(pix)
+    # Report a frame that could not be rendered
+    def _onRenderFailed(self, message):
+        self.statusBar().showMessage(message.strip().splitlines()[-1])
+        sys.stderr.write(message)
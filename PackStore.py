@@ -0,0 +1,33 @@
+#!/usr/bin/python
+"""
+Copy a FileStore into a packed store, whose files live in a few large
+containers, see PackedStore.py.
+
+usage: python PackStore.py PATH/info.json DESTINATION [--container-mb 2048]
+"""
+
+import argparse
+import sys
+
+import PackedStore
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('store', help='info.json of the store to pack')
+    parser.add_argument('destination', help='directory to write the packed store to')
+    parser.add_argument('--container-mb', type=int, default=2048,
+                        help='largest container size in MB (default %(default)s)')
+    parser.add_argument('--quiet', action='store_true')
+    args = parser.parse_args(argv)
+
+    def progress(count, name):
+        if not args.quiet and count % 1000 == 0:
+            sys.stderr.write('%d files packed\n' % count)
+
+    count = PackedStore.pack(args.store, args.destination,
+                             args.container_mb * 1024 * 1024, progress=progress)
+    sys.stderr.write('%d files packed into %s\n' % (count, args.destination))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,240 @@
+"""
+A FileStore whose files are packed into a few large container files.
+
+Stores with hundreds of thousands of small images are slow to open on
+network and parallel file systems, where every file costs a round trip to
+a metadata server. PackStore.py copies a FileStore's files into containers
+in a 'pack' directory, with an index of where each one starts. PackedStore
+reads them back from the containers, which are opened once and memory
+mapped, so loading an image never opens a file.
+"""
+
+import io
+import json
+import mmap
+import os
+import tempfile
+import threading
+import zlib
+
+import numpy as np
+import PIL.Image
+
+from cinema_python import cinema_store
+
+import Sidecars
+
+DIRECTORY = 'pack'
+INDEX = 'index.json'
+STORE_TYPE = 'PACKED'
+# Extensions PIL decodes straight from memory
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.tif', '.tiff', '.bmp')
+IMAGE_TYPES = ('RGB', 'VALUE', 'LUMINANCE')
+# Depth buffers as zlib compressed (.Z) or plain (.im) arrays
+RAW_EXTENSIONS = ('.z', '.im')
+
+class FileReader(object):
+    """ positional reads from one local container file """
+    def __init__(self, filename):
+        self._file = open(filename, 'rb')
+        self._size = os.fstat(self._file.fileno()).st_size
+        self._map = None
+        if self._size:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def readAt(self, offset, length):
+        if offset + length > self._size:
+            raise IOError("Read past the end of the container")
+        if not length:
+            return b''
+        return self._map[offset:offset + length]
+
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+        self._file.close()
+
+class PackedArchive(object):
+    """
+    The index of a pack directory. openReader(name) returns an object with
+    readAt(offset, length) for the container called name.
+    """
+    def __init__(self, directory, openReader=None):
+        self._directory = directory
+        self._openReader = openReader or self._openFile
+        with open(os.path.join(directory, INDEX)) as f:
+            index = json.load(f)
+        self._containers = index['containers']
+        self._files = index['files']
+        self._readers = {}
+        self._lock = threading.Lock()
+
+    def _openFile(self, name):
+        return FileReader(os.path.join(self._directory, name))
+
+    def __contains__(self, name):
+        return name in self._files
+
+    def __len__(self):
+        return len(self._files)
+
+    def read(self, name):
+        """ the contents of the file name, a path relative to the store """
+        container, offset, length = self._files[name]
+        with self._lock:
+            reader = self._readers.get(container)
+            if reader is None:
+                reader = self._openReader(self._containers[container])
+                self._readers[container] = reader
+        return reader.readAt(offset, length)
+
+    def close(self):
+        with self._lock:
+            for reader in self._readers.values():
+                reader.close()
+            self._readers = {}
+
+def relativeName(root, filename):
+    """ the index name of filename in a store rooted at root """
+    return os.path.relpath(filename, root).replace(os.sep, '/')
+
+class PackedStore(cinema_store.FileStore):
+    def __init__(self, dbfilename=None, archive=None):
+        super(PackedStore, self).__init__(dbfilename)
+        self._root = os.path.dirname(os.path.abspath(dbfilename))
+        if archive is None:
+            archive = PackedArchive(os.path.join(self._root, DIRECTORY))
+        self._archive = archive
+        # what decoding in memory gives the same arrays as FileStore, by
+        # (extension, image type), and the (dtype, shape) of raw depth
+        # files by (extension, decompressed size), False when it does not
+        self._trusted = {}
+        self._layouts = {}
+
+    def _load_data(self, doc_file, descriptor):
+        name = relativeName(self._root, doc_file)
+        if name not in self._archive:
+            # added to the store after it was packed
+            return super(PackedStore, self)._load_data(doc_file, descriptor)
+        contents = self._archive.read(name)
+        data = self._decode(doc_file, contents, descriptor)
+        return cinema_store.Document(descriptor, data)
+
+    def _decode(self, doc_file, contents, descriptor):
+        suffix = os.path.splitext(doc_file)[1]
+        extension = suffix.lower()
+        if extension == '.npy':
+            return np.load(io.BytesIO(contents))
+        if extension == '.npz':
+            arrays = np.load(io.BytesIO(contents))
+            return arrays[arrays.files[0]]
+
+        imageType = self.determine_type(descriptor)
+        if extension in IMAGE_EXTENSIONS and imageType in IMAGE_TYPES:
+            data = np.array(PIL.Image.open(io.BytesIO(contents)))
+            key = (extension, imageType)
+            # colour images are what PIL is for, the rest are checked once
+            if imageType == 'RGB' or self._trusted.get(key):
+                return data
+            if key not in self._trusted:
+                original = self._decodeFile(suffix, contents, descriptor)
+                self._trusted[key] = self._sameArray(data, original)
+                return original
+        elif extension in RAW_EXTENSIONS:
+            raw = zlib.decompress(contents) if extension == '.z' else contents
+            key = (extension, len(raw))
+            layout = self._layouts.get(key)
+            if layout:
+                dtype, shape = layout
+                return np.frombuffer(raw, dtype).reshape(shape)
+            if layout is None:
+                # learn how FileStore lays out files of this size, when
+                # it only reinterprets their bytes
+                original = self._decodeFile(suffix, contents, descriptor)
+                array = np.asarray(original)
+                if array.dtype.hasobject or array.tobytes() != raw:
+                    self._layouts[key] = False
+                else:
+                    self._layouts[key] = (array.dtype, array.shape)
+                return original
+
+        return self._decodeFile(suffix, contents, descriptor)
+
+    def _decodeFile(self, suffix, contents, descriptor):
+        # let FileStore decode it from a scratch copy, named like the
+        # original since FileStore goes by the extension
+        handle, scratch = tempfile.mkstemp(suffix=suffix)
+        try:
+            with os.fdopen(handle, 'wb') as f:
+                f.write(contents)
+            doc = super(PackedStore, self)._load_data(scratch, descriptor)
+        finally:
+            os.remove(scratch)
+        return doc.data
+
+    def _sameArray(self, data, original):
+        original = np.asarray(original)
+        return (data.shape == original.shape and data.dtype == original.dtype and
+                np.array_equal(data, original))
+
+def pack(source, destination, maxContainerBytes, progress=None):
+    """
+    Copy the FileStore whose info.json is source into the directory
+    destination as a packed store. Returns the number of files packed.
+    """
+    with open(source, 'rb') as f:
+        info_json = json.load(f)
+    metadata = info_json.get('metadata') or {}
+    if metadata.get('store_type') not in (None, 'MFS'):
+        raise ValueError("Only FileStores can be packed")
+    root = os.path.dirname(os.path.abspath(source))
+    destination = os.path.abspath(destination)
+    if destination == root:
+        raise ValueError("Pack into a different directory than the store")
+    packDirectory = os.path.join(destination, DIRECTORY)
+    if not os.path.exists(packDirectory):
+        os.makedirs(packDirectory)
+
+    # everything but info.json, directories we keep beside stores and the
+    # destination, when it is inside the store
+    names = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        if os.path.abspath(dirpath) == root:
+            dirnames[:] = [d for d in dirnames if d not in (DIRECTORY, Sidecars.DIRECTORY)]
+        dirnames[:] = [d for d in dirnames
+                       if os.path.abspath(os.path.join(dirpath, d)) != destination]
+        dirnames.sort()
+        for filename in sorted(filenames):
+            name = relativeName(root, os.path.join(dirpath, filename))
+            if name != 'info.json':
+                names.append(name)
+
+    containers = []
+    files = {}
+    out = None
+    try:
+        for name in names:
+            with open(os.path.join(root, name), 'rb') as f:
+                contents = f.read()
+            if out is None or (out.tell() and
+                               out.tell() + len(contents) > maxContainerBytes):
+                if out is not None:
+                    out.close()
+                containers.append('data-%03d.pack' % len(containers))
+                out = open(os.path.join(packDirectory, containers[-1]), 'wb')
+            files[name] = [len(containers) - 1, out.tell(), len(contents)]
+            out.write(contents)
+            if progress is not None:
+                progress(len(files), name)
+    finally:
+        if out is not None:
+            out.close()
+
+    with open(os.path.join(packDirectory, INDEX), 'w') as f:
+        json.dump({'version': 1, 'containers': containers, 'files': files}, f)
+
+    info_json['metadata'] = metadata
+    metadata['store_type'] = STORE_TYPE
+    with open(os.path.join(destination, 'info.json'), 'w') as f:
+        json.dump(info_json, f, indent=2)
+    return len(files)
@@ -0,0 +1,289 @@
+"""
+Plays through the values of a parameter at a fixed frame rate.
+
+Worker threads render frames ahead of the playhead into a small buffer, and
+a timer shows whichever frame is due. When rendering can not keep up,
+frames that are late are dropped instead of slowing playback down.
+"""
+
+from PySide.QtCore import *
+
+import collections
+import threading
+import time
+import traceback
+
+import numpy as np
+
+import ArrayImage
+import FrameRenderer
+
+DEFAULT_FPS = 10
+DEFAULT_WORKERS = 2
+# How many frames to render ahead of the playhead
+DEFAULT_BUFFER = 8
+
+class PlaybackEngine(QObject):
+    # Play modes
+    ONCE   = 0
+    LOOP   = 1
+    BOUNCE = 2
+
+    # (parameter name, value index, list of QImages, one per store) for
+    # every frame shown, None for stores that failed to render it
+    frameShown = Signal(str, int, object)
+    # (achieved frames per second, frames dropped so far)
+    fpsUpdated = Signal(float, int)
+    # Playback reached the end (ONCE mode) or was stopped
+    finished = Signal()
+    # Emitted with a description of what went wrong when a frame fails
+    renderFailed = Signal(str)
+
+    def __init__(self, loader=None, parent=None,
+                 numWorkers=DEFAULT_WORKERS, bufferSize=DEFAULT_BUFFER):
+        super(PlaybackEngine, self).__init__(parent)
+        self._loader = loader
+        self._numWorkers = numWorkers
+        self._bufferSize = bufferSize
+        self._fps = DEFAULT_FPS
+        self._mode = self.LOOP
+
+        self._timer = QTimer(self)
+        self._timer.timeout.connect(self._tick)
+
+        self._cond = threading.Condition()
+        self._threads = []
+        self._running = True
+        self._playing = False
+        self._generation = 0
+        self._stores = []
+        self._query = None
+        self._parameterName = None
+        self._values = []
+        self._startIndex = 0
+        # steps count frames since playback (re)started, _indexAt maps
+        # them to parameter value indices according to the mode
+        self._anchorStep = 0
+        self._anchorTime = 0
+        self._dueStep = 0
+        self._shownStep = -1
+        self._frames = {}
+        self._inProgress = set()
+        self._dropped = 0
+        self._shownTimes = collections.deque()
+
+    def setTargetFps(self, fps):
+        with self._cond:
+            self._reanchor()
+            self._fps = fps
+        self._timer.setInterval(self._interval())
+
+    def getTargetFps(self):
+        return self._fps
+
+    def setMode(self, mode):
+        """ one of ONCE, LOOP or BOUNCE, continuing from the current frame """
+        with self._cond:
+            if self._playing:
+                self._restartFrom(self._indexAt(max(self._shownStep, 0)))
+            self._mode = mode
+
+    def getMode(self):
+        return self._mode
+
+    def isPlaying(self):
+        return self._playing
+
+    def getParameterName(self):
+        return self._parameterName
+
+    def start(self, stores, parameterName, startIndex, query):
+        """
+        Start playing through the values of parameterName in stores, which
+        have the same parameters, from startIndex with the other parameters
+        as chosen in query. Each frame is rendered for every store.
+        """
+        self.stop()
+        with self._cond:
+            self._stores = list(stores)
+            self._query = query
+            self._parameterName = parameterName
+            self._values = stores[0].parameter_list[parameterName]['values']
+            if self._mode == self.ONCE and startIndex >= len(self._values) - 1:
+                # already at the end, play it from the start
+                startIndex = 0
+            self._restartFrom(startIndex)
+            self._dropped = 0
+            self._shownTimes.clear()
+            self._playing = True
+            self._cond.notify_all()
+        self._startWorkers()
+        self._timer.start(self._interval())
+
+    def setQuery(self, query):
+        """ change the other parameters while playing """
+        with self._cond:
+            self._query = query
+            self._generation += 1
+            self._frames.clear()
+            self._inProgress.clear()
+            self._cond.notify_all()
+
+    def stop(self):
+        self._timer.stop()
+        with self._cond:
+            wasPlaying = self._playing
+            self._playing = False
+            self._generation += 1
+            self._frames.clear()
+            self._inProgress.clear()
+            self._cond.notify_all()
+        if wasPlaying:
+            self.finished.emit()
+
+    def shutdown(self):
+        """ stop playing and end the worker threads """
+        self.stop()
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+
+    def _interval(self):
+        # look twice per frame so frames are not shown late by a whole tick
+        return max(1, int(1000.0 / self._fps / 2))
+
+    def _restartFrom(self, index):
+        # callers hold self._cond
+        self._startIndex = index
+        self._anchorStep = 0
+        self._anchorTime = time.time()
+        self._dueStep = 0
+        self._shownStep = -1
+        self._generation += 1
+        self._frames.clear()
+        self._inProgress.clear()
+
+    def _reanchor(self):
+        # keep the playhead where it is when the frame rate changes
+        self._anchorStep = self._dueStep
+        self._anchorTime = time.time()
+
+    def _indexAt(self, step):
+        count = len(self._values)
+        position = self._startIndex + step
+        if self._mode == self.ONCE:
+            return position if position < count else None
+        if self._mode == self.LOOP or count < 2:
+            return position % count
+        period = 2 * (count - 1)
+        position = position % period
+        return position if position < count else period - position
+
+    def _lastStep(self):
+        # the step of the last value in ONCE mode, None when playback wraps
+        if self._mode != self.ONCE:
+            return None
+        return len(self._values) - 1 - self._startIndex
+
+    def _tick(self):
+        with self._cond:
+            if not self._playing:
+                return
+            due = self._anchorStep + int((time.time() - self._anchorTime) * self._fps)
+            self._dueStep = due
+            ready = [step for step in self._frames if step <= due]
+            # frames that failed to render are None
+            shown = [step for step in ready if self._frames[step] is not None]
+            image = None
+            if shown:
+                step = max(shown)
+                image = self._frames[step]
+                self._dropped += step - self._shownStep - 1
+                self._shownStep = step
+                index = self._indexAt(step)
+            for old in ready:
+                del self._frames[old]
+            # frames may be dropped on the way, but not the last one, so
+            # stop once it has been shown or failed
+            last = self._lastStep()
+            done = last is not None and (self._shownStep >= last or last in ready)
+            self._cond.notify_all()
+
+        if image is not None:
+            now = time.time()
+            self._shownTimes.append(now)
+            while self._shownTimes and now - self._shownTimes[0] > 1.0:
+                self._shownTimes.popleft()
+            self.frameShown.emit(self._parameterName, index, image)
+            self.fpsUpdated.emit(float(len(self._shownTimes)), self._dropped)
+        if done:
+            self.stop()
+
+    def _startWorkers(self):
+        while len(self._threads) < self._numWorkers:
+            t = threading.Thread(target=self._work,
+                                 name='CinemaPlayback%d' % len(self._threads))
+            t.daemon = True
+            t.start()
+            self._threads.append(t)
+
+    def _nextStep(self):
+        # the earliest frame in the read-ahead window nobody is working on,
+        # which ends at the last frame in ONCE mode even when it is late
+        first = self._dueStep
+        last = self._lastStep()
+        if last is not None:
+            first = min(first, last)
+        for step in range(first, first + self._bufferSize):
+            if (step <= self._shownStep or step in self._frames or
+                step in self._inProgress):
+                continue
+            if self._indexAt(step) is None:
+                return None
+            return step
+        return None
+
+    def _work(self):
+        renderers = {}
+        while True:
+            with self._cond:
+                step = None
+                while self._running:
+                    if self._playing:
+                        step = self._nextStep()
+                        if step is not None:
+                            break
+                    self._cond.wait()
+                if not self._running:
+                    return
+                self._inProgress.add(step)
+                generation = self._generation
+                stores = self._stores
+                query = dict(self._query)
+                name = self._parameterName
+                query[name] = frozenset([self._values[self._indexAt(step)]])
+
+            renderers = dict((store, renderers.get(store) or
+                              FrameRenderer.FrameRenderer(store, self._loader))
+                             for store in stores)
+            images = [self._render(renderers[store], query) for store in stores]
+            # frames that failed for every store are None
+            image = images if any(i is not None for i in images) else None
+
+            with self._cond:
+                if generation != self._generation:
+                    continue
+                self._inProgress.discard(step)
+                if step > self._shownStep:
+                    self._frames[step] = image
+
+    def _render(self, renderer, query):
+        try:
+            frame = renderer.render(query)
+            if frame is not None:
+                # buffered frames must own their pixels
+                return ArrayImage.ArrayImageConverter().toQImage(np.array(frame))
+        except Exception:
+            # the frame is shown as missing, say why
+            self.renderFailed.emit(traceback.format_exc())
+        return None
@@ -0,0 +1,107 @@
+"""
+Loads the images for frames the user is likely to look at next into the
+image cache, on background threads.
+"""
+
+import collections
+import threading
+
+import ImageCache
+import LayerQuery
+
+# How many slider steps or camera angles ahead to load
+DEFAULT_DEPTH = 3
+DEFAULT_THREADS = 2
+
+class Prefetcher(object):
+    def __init__(self, store, cache=None, numThreads=DEFAULT_THREADS, plan=None):
+        self._store = store
+        self._plan = plan if plan is not None else LayerQuery.QueryPlan(store)
+        self._cache = cache if cache is not None else ImageCache.getDefaultCache()
+        self._cond = threading.Condition()
+        self._pending = collections.deque()
+        self._generation = 0
+        self._running = True
+        self._threads = []
+        for i in range(numThreads):
+            t = threading.Thread(target=self._work, name='CinemaPrefetch%d' % i)
+            t.daemon = True
+            t.start()
+            self._threads.append(t)
+
+    def prefetch(self, queries):
+        """
+        Replace any outstanding work with loading the frames for queries.
+        Each query maps parameter names to sets of values, like
+        MainWindow._currentQuery, and they are loaded most likely first.
+        """
+        with self._cond:
+            self._generation += 1
+            self._pending.clear()
+            for query in queries:
+                self._pending.append((self._generation, query))
+            self._cond.notify_all()
+
+    def cancel(self):
+        """ drop all outstanding work """
+        self.prefetch([])
+
+    def stop(self):
+        """ cancel outstanding work and shut down the worker threads """
+        with self._cond:
+            self._running = False
+            self._generation += 1
+            self._pending.clear()
+            self._cond.notify_all()
+
+    def _isStale(self, generation):
+        return generation != self._generation
+
+    def _work(self):
+        while True:
+            with self._cond:
+                while self._running and not self._pending:
+                    self._cond.wait()
+                if not self._running:
+                    return
+                generation, query = self._pending.popleft()
+            try:
+                self._load(generation, query)
+            except Exception:
+                # prefetching is only a hint, the render will report real errors
+                pass
+
+    def _load(self, generation, query):
+        layers, hasLayer = self._plan.buildLayers(query)
+        for layer in layers:
+            for img_type, fieldQuery in layer.getQueries():
+                # give up as soon as the user has moved somewhere else
+                if self._isStale(generation):
+                    return
+                self._cache.warm(self._store, fieldQuery)
+
+def neighbourIndices(index, count, step, depth=DEFAULT_DEPTH, wrap=False):
+    """
+    Indices of the values most likely to be visited after index, given the
+    last move was by step. Favors the direction of motion, and wraps around
+    the ends when wrap is set (as camera angles do).
+    """
+    if step > 0:
+        offsets = [k for k in range(1, depth+1)] + [-1]
+    elif step < 0:
+        offsets = [-k for k in range(1, depth+1)] + [1]
+    else:
+        offsets = []
+        for k in range(1, depth+1):
+            offsets.extend([k, -k])
+
+    indices = []
+    for offset in offsets:
+        i = index + offset
+        if wrap:
+            i = i % count
+        elif i < 0 or i >= count:
+            continue
+        if i != index and i not in indices:
+            indices.append(i)
+    return indices
@@ -0,0 +1,144 @@
+"""
+Decodes store images in a pool of worker processes, into shared memory.
+
+Decoding PNGs spends much of its time holding the GIL, so threads stop
+helping after a few cores. With CINEMA_DECODE_PROCESSES set to a number of
+processes, images are decoded by that many workers instead. Each worker
+writes the pixels into a slot of a shared memory arena and the viewer
+wraps the slot as an array without copying it. A slot is reused once no
+array uses its pixels any more, e.g. when the image cache lets go of it.
+Images that are bigger than a slot, or that come in when every slot is in
+use, are sent back through the pool's pipe instead.
+
+Workers are forked, so this is only available where fork is.
+"""
+
+import collections
+import ctypes
+import mmap
+import multiprocessing
+import os
+import threading
+import weakref
+
+import numpy as np
+
+import Instrumentation
+import StoreIndex
+
+# Set CINEMA_DECODE_PROCESSES to decode in that many processes, 0 decodes
+# on the loading threads
+PROCESSES = int(os.environ.get('CINEMA_DECODE_PROCESSES', 0))
+SLOTS = int(os.environ.get('CINEMA_DECODE_SLOTS', 64))
+SLOT_BYTES = int(os.environ.get('CINEMA_DECODE_SLOT_MB', 32)) * 1024 * 1024
+
+_decoders = weakref.WeakKeyDictionary()
+_decodersLock = threading.Lock()
+
+# what each worker decodes, and where to
+_store = None
+_arena = None
+_slotBytes = None
+
+def _startWorker(storeFilename, arena, slotBytes):
+    global _store, _arena, _slotBytes
+    # only workers open stores, the image cache imports this module
+    import StoreLoader
+    _arena = arena
+    _slotBytes = slotBytes
+    _store = StoreLoader.openStore(storeFilename)
+    StoreIndex.buildIndex(_store)
+
+def _decode(slot, query):
+    data = np.asarray(StoreIndex.load(_store, query))
+    if slot is None or data.nbytes > _slotBytes:
+        return data.shape, data.dtype.str, data
+    pixels = np.frombuffer(_arena, np.uint8, data.nbytes, slot * _slotBytes)
+    np.copyto(pixels.view(data.dtype).reshape(data.shape), data)
+    return data.shape, data.dtype.str, None
+
+class ProcessDecoder(object):
+    def __init__(self, storeFilename, processes=None,
+                 slots=SLOTS, slotBytes=SLOT_BYTES):
+        if not hasattr(os, 'fork'):
+            raise RuntimeError("Decoding in processes needs fork")
+        if processes is None:
+            processes = multiprocessing.cpu_count()
+        self._slotBytes = slotBytes
+        # anonymous shared memory, only pages that get written take up memory
+        self._arena = mmap.mmap(-1, slots * slotBytes)
+        self._free = collections.deque(range(slots))
+        self._inUse = {}
+        self._tracer = Instrumentation.getTracer()
+
+        if hasattr(multiprocessing, 'get_context'):
+            context = multiprocessing.get_context('fork')
+        else:
+            context = multiprocessing
+        # forked workers inherit the arena, it is never pickled
+        self._pool = context.Pool(processes, _startWorker,
+                                  (storeFilename, self._arena, slotBytes))
+
+    def load(self, query):
+        """ decoded data for query, possibly backed by shared memory """
+        try:
+            slot = self._free.popleft()
+        except IndexError:
+            slot = None
+        try:
+            with self._tracer.stage('decode.process'):
+                shape, dtype, data = self._pool.apply(_decode, (slot, query))
+        except Exception:
+            if slot is not None:
+                self._free.append(slot)
+            raise
+        if data is not None:
+            if slot is not None:
+                self._free.append(slot)
+            return data
+        return self._wrap(slot, shape, np.dtype(dtype))
+
+    def _wrap(self, slot, shape, dtype):
+        nbytes = int(np.prod(shape)) * dtype.itemsize
+        # every array viewing the slot keeps this alive, when the last one
+        # goes the slot is free again
+        owner = (ctypes.c_char * nbytes).from_buffer(self._arena, slot * self._slotBytes)
+        self._inUse[slot] = weakref.ref(owner, lambda ref: self._release(slot))
+        return np.frombuffer(owner, np.uint8).view(dtype).reshape(shape)
+
+    def _release(self, slot):
+        self._inUse.pop(slot, None)
+        self._free.append(slot)
+
+    def close(self):
+        """ shut down the worker processes """
+        # decodes in progress finish, so that no thread waits on them forever
+        self._pool.close()
+        self._pool.join()
+
+def attach(store, storeFilename, processes=PROCESSES):
+    """
+    Decode the images of store in processes worker processes, when that
+    is more than 0. Returns the decoder, or None.
+    """
+    if processes <= 0:
+        return None
+    decoder = ProcessDecoder(storeFilename, processes)
+    with _decodersLock:
+        _decoders[store] = decoder
+    return decoder
+
+def detach(store):
+    """ shut down the decoder of store, if it has one """
+    with _decodersLock:
+        decoder = _decoders.pop(store, None)
+    if decoder is not None:
+        decoder.close()
+
+def load(store, query):
+    """ decoded data for query, or None if store has no decoder """
+    with _decodersLock:
+        decoder = _decoders.get(store)
+    if decoder is None:
+        return None
+    return decoder.load(query)
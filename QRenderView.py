@@ -1,6 +1,9 @@
 from PySide.QtCore import *
 from PySide.QtGui import *
 
+import Instrumentation
+import TiledImageItem
+
 # Subclass of QGraphicsView that emits signals for various  events.  Emits
 # signals with the mouse position when the mouse is pressed, moved,
 # and released.
@@ -22,6 +25,14 @@ class QRenderView(QGraphicsView):
         self._pixmapItem.setTransformationMode(Qt.SmoothTransformation)
         self._scene.addItem(self._pixmapItem)
 
+        # Draws frames too big to convert at once, one tile at a time
+        self._tiledItem = TiledImageItem.TiledImageItem()
+        self._scene.addItem(self._tiledItem)
+
+        # Lines of text shown over the top left corner of the view
+        self._overlayLines = []
+        self._tracer = Instrumentation.getTracer()
+
     def mousePressEvent(self, mouseEvent):
         self.mousePressSignal.emit(mouseEvent)
 
@@ -75,5 +86,47 @@ class QRenderView(QGraphicsView):
     def wheelEvent(self, event):
         self.mouseWheelSignal.emit(event)
 
-    def setPixmap(self, pixmap):
+    # Show pixmap, drawn scale times its size
+    def setPixmap(self, pixmap, scale=1):
+        self._tiledItem.clear()
         self._pixmapItem.setPixmap(pixmap)
+        self._pixmapItem.setScale(scale)
+
+    # Show a width x height image drawn in tiles, see TiledImageItem
+    def setTiledSource(self, width, height, source, minStride=1):
+        self._pixmapItem.setPixmap(QPixmap())
+        self._tiledItem.setSource(width, height, source, minStride)
+
+    def paintEvent(self, event):
+        with self._tracer.stage('paint'):
+            super(QRenderView, self).paintEvent(event)
+
+    # Show lines of text in a box over the view, or nothing if empty
+    def setOverlayText(self, lines):
+        self._overlayLines = lines
+        # the overlay stays put when the scene scrolls, so it can't be
+        # updated piecemeal
+        if lines:
+            self.setViewportUpdateMode(QGraphicsView.FullViewportUpdate)
+        else:
+            self.setViewportUpdateMode(QGraphicsView.MinimalViewportUpdate)
+        self.viewport().update()
+
+    def drawForeground(self, painter, rect):
+        if not self._overlayLines:
+            return
+        painter.save()
+        # draw in viewport coordinates, unaffected by zoom and scrolling
+        painter.resetTransform()
+        metrics = painter.fontMetrics()
+        margin = 4
+        width = max(metrics.width(line) for line in self._overlayLines)
+        height = metrics.lineSpacing() * len(self._overlayLines)
+        painter.fillRect(0, 0, width + 2*margin, height + 2*margin,
+                         QColor(0, 0, 0, 160))
+        painter.setPen(Qt.white)
+        y = margin + metrics.ascent()
+        for line in self._overlayLines:
+            painter.drawText(margin, y, line)
+            y += metrics.lineSpacing()
+        painter.restore()
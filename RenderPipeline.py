@@ -0,0 +1,136 @@
+"""
+Renders frames on a background thread, always working on the most recently
+requested state and dropping requests that were superseded while waiting.
+"""
+
+from PySide.QtCore import *
+
+import threading
+import traceback
+
+import ArrayImage
+import Instrumentation
+
+# Resolution divisor for frames requested while the user is interacting
+PREVIEW_STRIDE = 2
+# How long input must pause before a preview is refined, in milliseconds
+REFINE_DELAY_MS = 150
+# Frames with at least this many pixels are drawn in tiles by default
+TILED_PIXELS = 4096 * 4096
+
+class RenderPipeline(QObject):
+    # Emitted on the GUI thread with (QImage or None, query, stride) for
+    # each frame that is still current when it finishes. Receivers must call
+    # frameConsumed once they are done with the QImage.
+    frameReady = Signal(object, object, int)
+    # Emitted instead of frameReady for frames to be drawn in tiles, with
+    # (layers, hasLayer, query, stride). The layers are loaded but not
+    # composited, that happens for each tile as it is drawn.
+    layersReady = Signal(object, bool, object, int)
+    # Emitted with a description of what went wrong when a frame fails
+    renderFailed = Signal(str)
+
+    def __init__(self, renderer, parent=None):
+        super(RenderPipeline, self).__init__(parent)
+        self._renderer = renderer
+        self._converter = ArrayImage.ArrayImageConverter()
+        self._tracer = Instrumentation.getTracer()
+        self._cond = threading.Condition()
+        self._pending = None
+        self._tiledPixels = TILED_PIXELS
+        self._generation = 0
+        self._running = True
+        # the last frame's pixels live in buffers the next frame reuses
+        self._consumed = threading.Event()
+        self._consumed.set()
+        self._thread = threading.Thread(target=self._work, name='CinemaRender')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def request(self, query, stride=1):
+        """
+        Ask for a frame. query maps parameter names to sets of values and
+        must not be modified afterwards. A stride above 1 asks for a preview
+        at 1/stride of the resolution. Replaces any request that has not
+        been started yet.
+        """
+        with self._cond:
+            self._pending = (query, stride)
+            self._generation += 1
+            self._cond.notify_all()
+
+    def setTiledPixels(self, pixels):
+        """ draw frames with at least this many pixels in tiles """
+        self._tiledPixels = pixels
+
+    def cancel(self):
+        """ drop the request that is waiting and any frame in progress """
+        with self._cond:
+            self._pending = None
+            self._generation += 1
+
+    def frameConsumed(self):
+        """ let the pipeline reuse the buffers of the last frame """
+        self._consumed.set()
+
+    def stop(self):
+        """ drop outstanding requests and shut down the render thread """
+        with self._cond:
+            self._running = False
+            self._pending = None
+            self._generation += 1
+            self._cond.notify_all()
+        self._consumed.set()
+
+    def _isStale(self, generation):
+        return generation != self._generation
+
+    def _work(self):
+        while True:
+            with self._cond:
+                while self._running and self._pending is None:
+                    self._cond.wait()
+                if not self._running:
+                    return
+                query, stride = self._pending
+                self._pending = None
+                generation = self._generation
+            try:
+                with self._tracer.stage('frame'):
+                    self._render(generation, query, stride)
+            except Exception:
+                # after stop the receivers may be gone
+                if self._running:
+                    self.renderFailed.emit(traceback.format_exc())
+
+    def _render(self, generation, query, stride):
+        # previews load reduced copies of the images
+        layers, hasLayer = self._renderer.load(query, stride)
+        if self._isStale(generation):
+            # loaded images are cached, so this was not wasted
+            return
+
+        if layers:
+            width, height = self._renderer.frameSize(layers)
+            if width * height >= self._tiledPixels:
+                if stride != 1:
+                    # tiles are drawn from the full resolution images
+                    layers, hasLayer = self._renderer.load(query)
+                    if self._isStale(generation):
+                        return
+                self.layersReady.emit(layers, hasLayer, query, stride)
+                return
+
+        # wait until the GUI is done with the buffers we composite into
+        self._consumed.wait()
+        if self._isStale(generation):
+            return
+        frame = self._renderer.composite(layers, hasLayer, stride)
+        image = None
+        if frame is not None:
+            with self._tracer.stage('qimage'):
+                image = self._converter.toQImage(frame)
+            if self._isStale(generation):
+                return
+            self._consumed.clear()
+        self.frameReady.emit(image, query, stride)
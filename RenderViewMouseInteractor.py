@@ -3,6 +3,10 @@ from PySide.QtCore import *
 
 import math
 
+# Apply mouse input to the view at most this often, about once per display
+# refresh, however many events come in
+UPDATE_INTERVAL_MS = 16
+
 class RenderViewMouseInteractor():
     NoneState   = 0
     RotateState = 1
@@ -54,6 +58,10 @@ class RenderViewMouseInteractor():
     def getScale(self):
         return self._scale
 
+    # True while a mouse button is held down over the view
+    def isDragging(self):
+        return self._state != self.NoneState and self._xy is not None
+
     @QtCore.Slot('QMouseEvent')
     def onMousePress(self, mouseEvent):
         if (mouseEvent.button() == Qt.LeftButton):
@@ -89,31 +97,24 @@ class RenderViewMouseInteractor():
                 self._xy = (mouseEvent.x(), mouseEvent.y())
 
         elif (self._state == self.ZoomState):
+            # 1% per pixel, dragging up zooms in
             scaleFactor = 1.01
-            if (dy < 0):
-                for i in range(-dy):
-                    self._scale = self._scale * scaleFactor
-            else:
-                for i in range(dy):
-                    self._scale = self._scale * (1.0 / scaleFactor)
+            self._scale = self._scale * scaleFactor ** -dy
             self._xy = (mouseEvent.x(), mouseEvent.y())
 
 
     @QtCore.Slot('QMouseEvent')
     def onMouseRelease(self, mouseEvent):
         self._xy = None
+        self._state = self.NoneState
 
     @QtCore.Slot('QWheelEvent')
     def onMouseWheel(self, event):
         scaleFactor = 1.01
-        # reduce the size of delta for more controllable zooming
-        dy = event.delta() / 20
-        if (dy > 0):
-            for i in range(dy):
-                self._scale = self._scale * scaleFactor
-        else:
-            for i in range(-dy):
-                self._scale = self._scale * (1.0 / scaleFactor)
+        # reduce the size of delta for more controllable zooming, fractions
+        # of a step count so small trackpad deltas still zoom
+        dy = event.delta() / 20.0
+        self._scale = self._scale * scaleFactor ** dy
 
 
     # Increment angle to be either the next or previous angle in the angle list
@@ -0,0 +1,121 @@
+"""
+Colors value fields through a colormap and shades them with luminance.
+
+Value images hold the data itself rather than colors, so they can be shown
+with any colormap and range without reading anything from the store again.
+The colormap is a lookup table, and mapping a value image is a handful of
+whole-array operations into buffers kept from one frame to the next.
+"""
+
+import collections
+import threading
+
+import numpy as np
+
+# Entries in a colormap's lookup table
+TABLE_SIZE = 256
+
+# name -> control points, (position from 0 to 1, (r, g, b))
+COLORMAPS = collections.OrderedDict([
+    ('Cool to Warm', [(0.0, (59, 76, 192)), (0.5, (221, 221, 221)),
+                      (1.0, (180, 4, 38))]),
+    ('Grayscale', [(0.0, (0, 0, 0)), (1.0, (255, 255, 255))]),
+    ('Rainbow', [(0.0, (0, 0, 255)), (0.25, (0, 255, 255)), (0.5, (0, 255, 0)),
+                 (0.75, (255, 255, 0)), (1.0, (255, 0, 0))]),
+    ('Viridis', [(0.0, (68, 1, 84)), (0.25, (59, 82, 139)), (0.5, (33, 145, 140)),
+                 (0.75, (94, 201, 98)), (1.0, (253, 231, 37))]),
+    ('Black-Body', [(0.0, (0, 0, 0)), (0.39, (230, 0, 0)), (0.58, (230, 230, 0)),
+                    (1.0, (255, 255, 255))]),
+])
+DEFAULT_COLORMAP = 'Cool to Warm'
+
+class Colormap(object):
+    def __init__(self, name, points):
+        self.name = name
+        positions = [p for p, color in points]
+        samples = np.linspace(0.0, 1.0, TABLE_SIZE)
+        table = np.empty((TABLE_SIZE, 3), np.float32)
+        for channel in range(3):
+            table[:, channel] = np.interp(samples, positions,
+                                          [color[channel] for p, color in points])
+        # float for shading, rounded bytes when there is no luminance
+        self.table = table
+        self.bytes = np.round(table).astype(np.uint8)
+
+_colormap = Colormap(DEFAULT_COLORMAP, COLORMAPS[DEFAULT_COLORMAP])
+_colormapLock = threading.Lock()
+
+def getColormap():
+    """ the colormap value fields are shown with """
+    return _colormap
+
+def setColormap(name):
+    """ show value fields with the colormap called name, from COLORMAPS """
+    global _colormap
+    with _colormapLock:
+        if name != _colormap.name:
+            _colormap = Colormap(name, COLORMAPS[name])
+
+class Shader(object):
+    """
+    Maps value images to colors. Each Shader keeps its own scratch
+    buffers, so use one per thread.
+    """
+    def __init__(self):
+        self._shape = None
+
+    def shade(self, values, luminance, valueRange, colormap, channels=3):
+        """
+        Return a new H x W x channels uint8 image of values (H x W or
+        H x W x 1) mapped through colormap, valueRange mapping to its ends.
+        Values outside the range take the end colors, NaNs the lowest one.
+        The first channel of a luminance image, if given, darkens each
+        pixel. A fourth channel is opaque alpha.
+        """
+        if values.ndim == 3:
+            values = values[:, :, 0]
+        self._allocate(values.shape)
+        scaled = self._scaled
+        index = self._index
+
+        low, high = valueRange
+        scale = (TABLE_SIZE - 1) / float(high - low) if high > low else 0.0
+        np.subtract(values, low, out=scaled)
+        np.multiply(scaled, scale, out=scaled)
+        np.clip(scaled, 0, TABLE_SIZE - 1, out=scaled)
+        np.isnan(scaled, out=self._nan)
+        np.copyto(scaled, 0, where=self._nan)
+        # round to the nearest entry
+        np.add(scaled, 0.5, out=scaled)
+        np.copyto(index, scaled, casting='unsafe')
+
+        out = np.empty(values.shape + (channels,), np.uint8)
+        if channels == 4:
+            out[:, :, 3] = 255
+        rgb = out[:, :, :3]
+        if luminance is None:
+            np.take(colormap.bytes, index, axis=0, out=rgb)
+            return out
+        if luminance.ndim == 3:
+            luminance = luminance[:, :, 0]
+        shaded = self._shaded
+        np.take(colormap.table, index, axis=0, out=shaded)
+        np.multiply(luminance, 1.0 / 255, out=scaled)
+        np.multiply(shaded, scaled[:, :, np.newaxis], out=shaded)
+        np.copyto(rgb, shaded, casting='unsafe')
+        return out
+
+    def _allocate(self, shape):
+        if self._shape != shape:
+            self._shape = shape
+            self._scaled = np.empty(shape, np.float32)
+            self._nan = np.empty(shape, np.bool_)
+            self._index = np.empty(shape, np.intp)
+            self._shaded = np.empty(shape + (3,), np.float32)
+
+def valueRange(values):
+    """ the smallest and largest value in values, ignoring NaNs """
+    finite = values[np.isfinite(values)]
+    if finite.size == 0:
+        return 0.0, 1.0
+    return float(finite.min()), float(finite.max())
@@ -0,0 +1,166 @@
+"""
+Uncompressed copies of a store's depth and value fields, kept next to it.
+
+Depth and value images are raw float arrays that the store keeps
+compressed, so every load pays for decompressing them. ConvertSidecars.py
+writes them out once as .npy files in a 'sidecars' directory beside
+info.json. When that directory exists they are memory mapped instead of
+decoded, so compositing only touches the pages it reads.
+
+The converter also writes copies of every field with only every other pixel
+of every other row, which previews shown while interacting load instead of
+the full images. It records the range of every value field at full
+resolution, so that previews are colored like the full frames.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import weakref
+
+import numpy as np
+
+import LayerQuery
+import Shader
+
+DIRECTORY = 'sidecars'
+INDEX = 'index.json'
+# Image types worth converting, RGB images are small and cheap to decode
+TYPES = ('Z', 'VALUE')
+# Reduced resolution copies are written of every type, at this stride
+PREVIEW_STRIDE = 2
+PREVIEW_TYPES = ('RGB', 'Z', 'VALUE', 'LUMINANCE')
+
+_sets = weakref.WeakKeyDictionary()
+_setsLock = threading.Lock()
+
+def queryKey(query):
+    """ a string that identifies a field query """
+    return json.dumps(sorted(query.items()))
+
+def directoryFor(storeFilename):
+    return os.path.join(os.path.dirname(os.path.abspath(storeFilename)), DIRECTORY)
+
+class SidecarSet(object):
+    def __init__(self, directory):
+        self._directory = directory
+        with open(os.path.join(directory, INDEX)) as f:
+            index = json.load(f)
+        self._entries = index['entries']
+        # reduced resolution copies by stride
+        self._levels = dict((int(stride), entries) for stride, entries
+                            in index.get('levels', {}).items())
+        self._ranges = index.get('ranges', {})
+
+    def __len__(self):
+        return len(self._entries)
+
+    def load(self, query, stride=1):
+        """
+        memory mapped, read only array for query at 1/stride of its
+        resolution, or None
+        """
+        entries = self._entries if stride == 1 else self._levels.get(stride, {})
+        name = entries.get(queryKey(query))
+        if name is None:
+            return None
+        return np.load(os.path.join(self._directory, name), mmap_mode='r')
+
+    def valueRange(self, query):
+        """ (smallest, largest) of the value field query, or None """
+        valueRange = self._ranges.get(queryKey(query))
+        if valueRange is None:
+            return None
+        return tuple(valueRange)
+
+def attach(store, storeFilename):
+    """ use the sidecars of the store at storeFilename, if it has any """
+    directory = directoryFor(storeFilename)
+    if not os.path.exists(os.path.join(directory, INDEX)):
+        return None
+    sidecars = SidecarSet(directory)
+    with _setsLock:
+        _sets[store] = sidecars
+    return sidecars
+
+def load(store, query, stride=1):
+    """ the sidecar array for query, or None if there isn't one """
+    with _setsLock:
+        sidecars = _sets.get(store)
+    if sidecars is None:
+        return None
+    return sidecars.load(query, stride)
+
+def valueRange(store, query):
+    """ the recorded range of the value field query, or None """
+    with _setsLock:
+        sidecars = _sets.get(store)
+    if sidecars is None:
+        return None
+    return sidecars.valueRange(query)
+
+def convert(store, storeFilename, loader, types=TYPES, progress=None,
+            previewStride=PREVIEW_STRIDE, previewTypes=PREVIEW_TYPES):
+    """
+    Write sidecars for every field of the given image types, using
+    loader(store, query) to read the originals, and copies at 1/previewStride
+    of the resolution of every field of previewTypes, unless previewStride
+    is 0, and the range of every value field. Fields converted before are
+    kept. Returns the number of sidecars.
+    """
+    directory = directoryFor(storeFilename)
+    if not os.path.exists(directory):
+        os.makedirs(directory)
+    indexFilename = os.path.join(directory, INDEX)
+    entries = {}
+    levels = {}
+    ranges = {}
+    if os.path.exists(indexFilename):
+        with open(indexFilename) as f:
+            index = json.load(f)
+        entries = index['entries']
+        levels = index.get('levels', {})
+        ranges = index.get('ranges', {})
+    previews = levels.setdefault(str(previewStride), {}) if previewStride else {}
+
+    def exists(entries, key, name):
+        return entries.get(key) == name and os.path.exists(os.path.join(directory, name))
+
+    written = 0
+    for img_type, query in LayerQuery.allFieldQueries(store):
+        full = img_type in types
+        preview = previewStride and img_type in previewTypes
+        key = queryKey(query)
+        digest = hashlib.sha1(key.encode('utf-8')).hexdigest()
+        name = digest + '.npy'
+        previewName = '%s.%d.npy' % (digest, previewStride)
+        full = full and not exists(entries, key, name)
+        preview = preview and not exists(previews, key, previewName)
+        needsRange = img_type == 'VALUE' and key not in ranges
+        if not (full or preview or needsRange):
+            continue
+        data = loader(store, query)
+        if needsRange:
+            ranges[key] = Shader.valueRange(data)
+        if full:
+            np.save(os.path.join(directory, name), np.ascontiguousarray(data))
+            entries[key] = name
+        if preview:
+            # every stride-th pixel, not an average, so depths stay depths
+            data = np.ascontiguousarray(data[::previewStride, ::previewStride])
+            np.save(os.path.join(directory, previewName), data)
+            previews[key] = previewName
+        written += 1
+        if progress is not None:
+            progress(written, query)
+
+    # replace the index in one go, so readers never see half of it
+    temporary = indexFilename + '.tmp'
+    with open(temporary, 'w') as f:
+        json.dump({'version': 1, 'entries': entries, 'levels': levels,
+                   'ranges': ranges}, f)
+    if os.path.exists(indexFilename):
+        os.remove(indexFilename)
+    os.rename(temporary, indexFilename)
+    return len(entries)
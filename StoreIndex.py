@@ -0,0 +1,100 @@
+"""
+Hash index from parameter values to the files of a store.
+
+Going through store.find for every field of every layer means running the
+store's generic query matching each time. The index enumerates the field
+queries the viewer can make of a store once, and then resolves a query
+with a single dictionary lookup. Anything it can not resolve goes to
+store.find as before.
+"""
+
+import threading
+import weakref
+
+import Instrumentation
+import LayerQuery
+
+# Do not index stores with more documents than this
+MAX_ENTRIES = 2000000
+
+_indices = weakref.WeakKeyDictionary()
+_indicesLock = threading.Lock()
+
+class StoreIndex(object):
+    def __init__(self, store):
+        self._store = store
+        self._names = sorted(store.parameter_list.keys())
+        self._locations = {}
+        # FileStores know where each document lives and how to read it
+        self._getFilename = getattr(store, '_get_filename', None)
+        self._loadData = getattr(store, '_load_data', None)
+        self._usable = (self._getFilename is not None and
+                        self._loadData is not None)
+
+    def key(self, query):
+        """ the values of query in sorted parameter name order """
+        return tuple([query.get(name) for name in self._names])
+
+    def build(self, maxEntries=MAX_ENTRIES):
+        """ record the file of every field query the viewer can make """
+        if not self._usable:
+            return
+        locations = {}
+        for img_type, query in LayerQuery.allFieldQueries(self._store):
+            try:
+                locations[self.key(query)] = self._getFilename(query)
+            except Exception:
+                pass
+            if len(locations) > maxEntries:
+                # too big to be worth holding in memory
+                return
+        self._locations = locations
+
+    def __len__(self):
+        return len(self._locations)
+
+    def load(self, query):
+        """ return the decoded data for query """
+        if self._usable:
+            location = self._locations.get(self.key(query))
+            if location is not None:
+                try:
+                    with Instrumentation.getTracer().stage('decode'):
+                        doc = self._loadData(location, query)
+                    # _load_data returns a Document, like store.find
+                    return doc.data
+                except Exception:
+                    # the store does not read files the way we expect,
+                    # stop trying and use find from now on
+                    self._usable = False
+        return find(self._store, query)
+
+def find(store, query):
+    """ decoded data of the first document in store matching query """
+    with Instrumentation.getTracer().stage('store.find'):
+        for doc in store.find(query):
+            return doc.data
+    raise KeyError("Nothing in the store matches %s" % query)
+
+def buildIndex(store):
+    """
+    Start indexing store on a background thread. Lookups go to store.find
+    until the index is ready.
+    """
+    index = StoreIndex(store)
+    def _build():
+        index.build()
+        with _indicesLock:
+            _indices[store] = index
+    t = threading.Thread(target=_build, name='CinemaStoreIndex')
+    t.daemon = True
+    t.start()
+    return t
+
+def load(store, query):
+    """ decoded data for query, through the store's index if it has one """
+    with _indicesLock:
+        index = _indices.get(store)
+    if index is not None:
+        return index.load(query)
+    return find(store, query)
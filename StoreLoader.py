@@ -0,0 +1,61 @@
+"""
+Opens a cinema store of whatever type its info.json describes.
+"""
+
+import re
+
+# Import cinema IO
+from cinema_python import cinema_store
+
+import HttpStore
+import PackedStore
+import Sidecars
+
+# Finds the store type without parsing the whole of info.json, the store
+# parses it when it loads
+_STORE_TYPE = re.compile(br'"store_type"\s*:\s*"([^"]*)"')
+
+def storeType(filename):
+    """ the metadata store_type of the info.json at filename, or None """
+    with open(filename, mode="rb") as file:
+        match = _STORE_TYPE.search(file.read())
+    if match is None:
+        return None
+    return match.group(1).decode('utf-8')
+
+def openStore(filename):
+    """
+    open and load the store described by the info.json at filename, which
+    may be an http(s) URL
+    """
+    if HttpStore.isUrl(filename):
+        return _openRemoteStore(filename)
+
+    store_type = storeType(filename)
+    if store_type == "SFS":
+        cs = cinema_store.SingleFileStore(filename)
+    elif store_type == PackedStore.STORE_TYPE:
+        cs = PackedStore.PackedStore(filename)
+    else:
+        cs = cinema_store.FileStore(filename)
+
+    cs.load()
+
+    # use memory mapped depth and value fields when they've been converted
+    Sidecars.attach(cs, filename)
+    return cs
+
+def _openRemoteStore(url):
+    remote = HttpStore.RemoteStore(url)
+    # stores read their local mirror, which files are downloaded into
+    filename = remote.fetchInfo()
+    store_type = storeType(filename)
+    if store_type == "SFS":
+        raise ValueError("Single file stores can not be read over HTTP")
+    elif store_type == PackedStore.STORE_TYPE:
+        cs = PackedStore.PackedStore(filename, remote.packedArchive())
+    else:
+        cs = HttpStore.HttpStore(filename, remote)
+
+    cs.load()
+    return cs
@@ -0,0 +1,147 @@
+"""
+Shows the frames of one store in a QRenderView.
+
+MainWindow keeps one StoreView per store it compares. They all render the
+same query, through the window's LayerLoader and frame cache, so frames
+for every store are loaded by one pool of threads within one memory
+budget. Each has its own render thread, so none waits for another.
+"""
+
+from PySide.QtCore import *
+from PySide.QtGui import *
+
+import FrameRenderer
+import Instrumentation
+import LayerQuery
+import Prefetcher
+import RenderPipeline
+import StoreIndex
+from QRenderView import *
+
+class StoreView(QObject):
+    # Emitted when a frame, preview or not, is shown
+    frameShown = Signal()
+    # Emitted with a description of what went wrong when a frame fails
+    renderFailed = Signal(str)
+
+    def __init__(self, store, loader, frameCache, parent=None, dependencyTable=None):
+        super(StoreView, self).__init__(parent)
+        self._store = store
+        self._frameCache = frameCache
+
+        self._widget = QRenderView(parent)
+        self._widget.setRenderHints(QPainter.SmoothPixmapTransform)
+        self._widget.setAlignment(Qt.AlignCenter)
+        self._widget.setSizePolicy(QSizePolicy.Ignored, QSizePolicy.Ignored)
+
+        # How to turn choices into layers, compiled once for the store
+        self._queryPlan = LayerQuery.QueryPlan(store, dependencyTable)
+
+        # Index the store's documents for fast lookups
+        StoreIndex.buildIndex(store)
+
+        # Load likely next frames in the background
+        self._prefetcher = Prefetcher.Prefetcher(store, plan=self._queryPlan)
+
+        # Render in the background, showing frames as they complete
+        renderer = FrameRenderer.FrameRenderer(store, loader, self._queryPlan)
+        self._pipeline = RenderPipeline.RenderPipeline(renderer, self)
+        self._pipeline.frameReady.connect(self._onFrameReady)
+        self._pipeline.layersReady.connect(self._onLayersReady)
+        self._pipeline.renderFailed.connect(self.renderFailed)
+        # composites the tiles of large frames as they are drawn
+        self._tileRenderer = FrameRenderer.FrameRenderer(store, loader, self._queryPlan)
+
+        self._showingCachedFrame = False
+        self._shownStride = 1
+        self._stopped = False
+
+    def getStore(self):
+        return self._store
+
+    def getWidget(self):
+        return self._widget
+
+    def isShowingCachedFrame(self):
+        return self._showingCachedFrame
+
+    def getShownStride(self):
+        return self._shownStride
+
+    def render(self, query, stride=1):
+        """
+        Show the frame for query, from the frame cache if it is there and
+        otherwise once the pipeline has rendered it at 1/stride resolution.
+        Returns whether it has to be rendered.
+        """
+        pix = self._frameCache.get(self._frameCache.key(self._store, query))
+        if pix is not None:
+            # whatever the pipeline is working on is out of date now
+            self._pipeline.cancel()
+            self._showingCachedFrame = True
+            self.showPixmap(pix)
+            return False
+        self._showingCachedFrame = False
+        self._pipeline.request(query, stride)
+        return True
+
+    def prefetch(self, queries):
+        self._prefetcher.prefetch(queries)
+
+    def setTiled(self, tiled):
+        """ draw every frame in tiles, or only large ones """
+        self._pipeline.setTiledPixels(0 if tiled else RenderPipeline.TILED_PIXELS)
+
+    def putFrame(self, query, pix):
+        """ remember pix as the frame for query, e.g. one played back """
+        self._frameCache.put(self._frameCache.key(self._store, query), pix)
+
+    # Show a frame, stretched by stride if it has reduced resolution
+    def showPixmap(self, pix, stride=1):
+        # Try to resize the display widget
+        if stride == 1:
+            self._widget.sizeHint = pix.size
+        self._widget.setPixmap(pix, stride)
+        self._shownStride = stride
+        self.frameShown.emit()
+
+    def stop(self):
+        """ stop rendering and prefetching, for good """
+        self._stopped = True
+        self._pipeline.stop()
+        self._prefetcher.stop()
+
+    # Display a frame finished by the render pipeline
+    def _onFrameReady(self, qimg, query, stride):
+        if self._stopped or self._showingCachedFrame:
+            # finished before it was cancelled, the cached frame is newer,
+            # or the view is going away
+            self._pipeline.frameConsumed()
+            return
+        try:
+            if qimg is None:
+                self._widget.setPixmap(None)
+                self._widget.setAlignment(Qt.AlignCenter)
+                return
+
+            # QPixmap.fromImage is the only copy made of the composited frame
+            with Instrumentation.getTracer().stage('pixmap'):
+                pix = QPixmap.fromImage(qimg)
+        finally:
+            self._pipeline.frameConsumed()
+        if stride == 1:
+            self.putFrame(query, pix)
+        self.showPixmap(pix, stride)
+
+    # Display a frame that is composited one tile at a time as it is drawn
+    def _onLayersReady(self, layers, hasLayer, query, stride):
+        if self._stopped or self._showingCachedFrame:
+            return
+        renderer = self._tileRenderer
+        def source(x, y, width, height, tileStride):
+            return renderer.composite(layers, hasLayer, tileStride,
+                                      (x, y, width, height))
+        width, height = renderer.frameSize(layers)
+        self._widget.setTiledSource(width, height, source, stride)
+        self._shownStride = stride
+        self.frameShown.emit()
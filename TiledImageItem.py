@@ -0,0 +1,95 @@
+"""
+Draws a very large image in tiles, making only the tiles that are visible.
+"""
+
+from PySide.QtCore import *
+from PySide.QtGui import *
+
+import collections
+import math
+
+import ArrayImage
+import Instrumentation
+
+# Tile width and height in screen pixels
+TILE_SIZE = 512
+# How many tile pixmaps to keep
+MAX_TILES = 128
+
+class TiledImageItem(QGraphicsItem):
+    """
+    A width x height image whose pixels come from source(x, y, width,
+    height, stride), which returns a numpy array of every stride-th pixel
+    of every stride-th row of that region. When zoomed out tiles are made
+    at a stride that matches the zoom, so they never hold many more pixels
+    than the screen shows.
+    """
+    def __init__(self, parent=None):
+        super(TiledImageItem, self).__init__(parent)
+        # needed for exposedRect
+        self.setFlag(QGraphicsItem.ItemUsesExtendedStyleOption, True)
+        self._width = 0
+        self._height = 0
+        self._source = None
+        self._minStride = 1
+        self._tiles = collections.OrderedDict()
+        self._converter = ArrayImage.ArrayImageConverter()
+        self._tracer = Instrumentation.getTracer()
+
+    def setSource(self, width, height, source, minStride=1):
+        """ show a new image, with at most 1/minStride of its resolution """
+        self.prepareGeometryChange()
+        self._width = width
+        self._height = height
+        self._source = source
+        self._minStride = minStride
+        self._tiles.clear()
+        self.update()
+
+    def clear(self):
+        self.setSource(0, 0, None)
+
+    def boundingRect(self):
+        return QRectF(0, 0, self._width, self._height)
+
+    def paint(self, painter, option, widget=None):
+        if self._source is None:
+            return
+        lod = QStyleOptionGraphicsItem.levelOfDetailFromTransform(painter.worldTransform())
+        stride = self._strideFor(lod)
+        span = TILE_SIZE * stride
+        exposed = option.exposedRect.intersected(self.boundingRect())
+        if exposed.isEmpty():
+            return
+        firstColumn = int(exposed.left()) // span
+        lastColumn = (int(math.ceil(exposed.right())) - 1) // span
+        firstRow = int(exposed.top()) // span
+        lastRow = (int(math.ceil(exposed.bottom())) - 1) // span
+        for row in range(firstRow, lastRow + 1):
+            for column in range(firstColumn, lastColumn + 1):
+                x = column * span
+                y = row * span
+                width = min(span, self._width - x)
+                height = min(span, self._height - y)
+                pixmap = self._tile(stride, x, y, width, height)
+                painter.drawPixmap(QRectF(x, y, width, height), pixmap,
+                                   QRectF(pixmap.rect()))
+
+    def _strideFor(self, lod):
+        # the coarsest power of two that still has a pixel per screen pixel
+        stride = self._minStride
+        while lod > 0 and lod * stride * 2 <= 1:
+            stride *= 2
+        return stride
+
+    def _tile(self, stride, x, y, width, height):
+        key = (stride, x, y)
+        pixmap = self._tiles.pop(key, None)
+        if pixmap is None:
+            with self._tracer.stage('tile'):
+                array = self._source(x, y, width, height, stride)
+                pixmap = QPixmap.fromImage(self._converter.toQImage(array))
+            while len(self._tiles) >= MAX_TILES:
+                self._tiles.popitem(last=False)
+        self._tiles[key] = pixmap
+        return pixmap
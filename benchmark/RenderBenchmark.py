@@ -0,0 +1,113 @@
+"""
+Times the stages of rendering frames from a store, headlessly.
+
+The stages are the same ones MainWindow goes through for every frame:
+building the layer queries, loading images, shading value fields into
+colors, compositing, wrapping the result as a QImage and (when a GUI is
+available) making the QPixmap.
+"""
+
+import itertools
+import time
+
+import numpy as np
+
+import ArrayImage
+import FrameRenderer
+import ImageCache
+import Instrumentation
+import LayerLoader
+
+STAGES = ['query', 'load', 'shade', 'composite', 'qimage', 'pixmap']
+
+def defaultQuery(store):
+    """
+    Parameter defaults, as MainWindow starts with, but with every value of
+    option parameters turned on so all layers get rendered.
+    """
+    query = {}
+    for name, properties in store.parameter_list.items():
+        if properties.get('type') == 'option':
+            query[name] = frozenset(properties['values'])
+        else:
+            query[name] = frozenset([properties['default']])
+    return query
+
+def sweepQueries(store, sweep=('time', 'phi', 'theta')):
+    """ queries for every combination of the sweep parameters' values """
+    base = defaultQuery(store)
+    names = [n for n in sweep if n in store.parameter_list]
+    valueLists = [store.parameter_list[n]['values'] for n in names]
+    queries = []
+    for values in itertools.product(*valueLists):
+        query = dict(base)
+        for name, value in zip(names, values):
+            query[name] = frozenset([value])
+        queries.append(query)
+    return queries
+
+def run(store, queries, repeat=1, cold=False, serial=False, pixmaps=False):
+    """
+    Render every query repeat times, and return the timings as a dict that
+    can be written out as JSON. cold empties the image cache before every
+    frame, so each frame pays for reading and decoding its files.
+    """
+    cache = ImageCache.ImageCache()
+    loader = LayerLoader.LayerLoader(serial=serial, cache=cache)
+    renderer = FrameRenderer.FrameRenderer(store, loader)
+    converter = ArrayImage.ArrayImageConverter()
+    tracer = Instrumentation.getTracer()
+    if pixmaps:
+        from PySide.QtGui import QPixmap
+
+    timings = dict((stage, []) for stage in STAGES)
+    pixels = 0
+    start = time.time()
+    for r in range(repeat):
+        for query in queries:
+            if cold:
+                cache.clear()
+            t0 = time.time()
+            layers, hasLayer = renderer.buildLayers(query)
+            t1 = time.time()
+            renderer.loadLayers(layers)
+            t2 = time.time()
+            frame = renderer.composite(layers, hasLayer)
+            t3 = time.time()
+            if frame is None:
+                continue
+            qimg = converter.toQImage(frame)
+            t4 = time.time()
+            if pixmaps:
+                QPixmap.fromImage(qimg)
+            t5 = time.time()
+
+            timings['query'].append(t1 - t0)
+            timings['load'].append(t2 - t1)
+            # FrameRenderer.composite shades before it composites
+            shade = tracer.latest('shade')
+            timings['shade'].append(shade)
+            timings['composite'].append(t3 - t2 - shade)
+            timings['qimage'].append(t4 - t3)
+            if pixmaps:
+                timings['pixmap'].append(t5 - t4)
+            pixels += frame.shape[0] * frame.shape[1]
+    elapsed = time.time() - start
+
+    frames = len(timings['query'])
+    return {'frames': frames,
+            'seconds': elapsed,
+            'framesPerSecond': frames / elapsed if elapsed > 0 else None,
+            'megapixelsPerSecond': pixels / elapsed / 1e6 if elapsed > 0 else None,
+            'stages': dict((stage, summarize(times))
+                           for stage, times in timings.items() if times),
+            'cache': cache.stats()}
+
+def summarize(times):
+    """ latency percentiles, in milliseconds """
+    ms = np.array(times) * 1000.0
+    return {'mean': float(ms.mean()),
+            'p50': float(np.percentile(ms, 50)),
+            'p90': float(np.percentile(ms, 90)),
+            'p99': float(np.percentile(ms, 99)),
+            'max': float(ms.max())}
@@ -0,0 +1,96 @@
+"""
+Writes synthetic cinema stores of configurable size for benchmarking.
+
+Each store has time, phi and theta parameters and a 'layer' option
+parameter with a 'field' below it, so frames go through the same layered
+query building, loading and depth compositing as real data.
+"""
+
+import os
+
+import numpy as np
+
+from cinema_python import cinema_store
+
+# field value -> image type, as understood by cinema_store.make_field
+FIELD_TYPES = {'rgb': 'rgb',
+               'depth': 'depth',
+               'value': 'value',
+               'luminance': 'luminance'}
+
+def generate(path, width=512, height=512, times=4, phis=8, thetas=3,
+             layers=3, fields=('rgb', 'depth', 'value', 'luminance'),
+             storeType='MFS', seed=0):
+    """
+    Write a store to the directory path and return the filename of its
+    info.json. storeType is 'MFS' for a FileStore or 'SFS' for a
+    SingleFileStore.
+    """
+    if 'depth' not in fields:
+        raise ValueError("Layers need a depth field to be composited")
+    if not os.path.exists(path):
+        os.makedirs(path)
+    filename = os.path.join(path, 'info.json')
+
+    if storeType == 'SFS':
+        cs = cinema_store.SingleFileStore(filename)
+    else:
+        cs = cinema_store.FileStore(filename)
+    cs.filename_pattern = "{time}/{phi}/{theta}/{layer}/{field}.png"
+
+    timeValues = list(range(times))
+    phiValues = [int(i * 360 / phis) for i in range(phis)]
+    thetaValues = [int(-90 + (i + 1) * 180 / (thetas + 1)) for i in range(thetas)]
+    layerValues = ['layer%d' % i for i in range(layers)]
+
+    cs.add_parameter('time', cinema_store.make_parameter(
+        'time', timeValues, typechoice='range'))
+    cs.add_parameter('phi', cinema_store.make_parameter(
+        'phi', phiValues, typechoice='range'))
+    cs.add_parameter('theta', cinema_store.make_parameter(
+        'theta', thetaValues, typechoice='range'))
+    cs.add_layer('layer', cinema_store.make_parameter(
+        'layer', layerValues, typechoice='option'))
+    cs.add_field('field', cinema_store.make_field(
+        'field', dict((f, FIELD_TYPES[f]) for f in fields)),
+        'layer', layerValues)
+    cs.create()
+
+    rng = np.random.RandomState(seed)
+    ys, xs = np.mgrid[0:height, 0:width].astype(np.float32)
+    for t in timeValues:
+        for phi in phiValues:
+            for theta in thetaValues:
+                for li, layer in enumerate(layerValues):
+                    images = _layerImages(rng, xs, ys, t, phi, theta, li)
+                    for field in fields:
+                        doc = cinema_store.Document(
+                            {'time': t, 'phi': phi, 'theta': theta,
+                             'layer': layer, 'field': field})
+                        doc.data = images[field]
+                        cs.insert(doc)
+    cs.save()
+    return filename
+
+def _layerImages(rng, xs, ys, t, phi, theta, layerIndex):
+    # a tilted plane per layer, so that layers interleave in depth
+    height, width = xs.shape
+    angle = np.radians(phi + theta + 37 * layerIndex + 11 * t)
+    depth = (0.5 + 0.25 * np.cos(angle) * (xs / width - 0.5) +
+             0.25 * np.sin(angle) * (ys / height - 0.5)).astype(np.float32)
+    # with some background, where nothing is drawn
+    background = rng.uniform(size=(height, width)) < 0.1
+    depth[background] = 1.0
+
+    value = (np.sin(xs / 37.0 + layerIndex) * np.cos(ys / 53.0 + t)).astype(np.float32)
+
+    rgb = np.empty((height, width, 3), np.uint8)
+    rgb[:, :, 0] = (xs * 255 / width).astype(np.uint8)
+    rgb[:, :, 1] = (ys * 255 / height).astype(np.uint8)
+    rgb[:, :, 2] = (layerIndex * 67) % 256
+    rgb[background] = 0
+
+    shade = (255 * (1.0 - depth)).astype(np.uint8)
+    luminance = np.dstack([shade, shade, shade])
+
+    return {'rgb': rgb, 'depth': depth, 'value': value, 'luminance': luminance}
@@ -0,0 +1,8 @@
+"""
+Headless benchmarks of the viewer's rendering path.
+
+Run from the top of the repository, e.g.
+    python -m benchmark suite
+    python -m benchmark generate /tmp/store --width 1920 --height 1080
+    python -m benchmark run /tmp/store/info.json --cold
+"""
@@ -0,0 +1,120 @@
+"""
+Command line entry point, see benchmark/__init__.py for usage.
+"""
+
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+def _generateArgs(parser):
+    parser.add_argument('--width', type=int, default=512)
+    parser.add_argument('--height', type=int, default=512)
+    parser.add_argument('--times', type=int, default=4)
+    parser.add_argument('--phis', type=int, default=8)
+    parser.add_argument('--thetas', type=int, default=3)
+    parser.add_argument('--layers', type=int, default=3)
+    parser.add_argument('--fields', default='rgb,depth,value,luminance',
+                        help='comma separated subset of rgb,depth,value,luminance')
+
+def _runArgs(parser):
+    parser.add_argument('--repeat', type=int, default=1,
+                        help='times to go through the sweep')
+    parser.add_argument('--cold', action='store_true',
+                        help='empty the image cache before every frame')
+    parser.add_argument('--serial', action='store_true',
+                        help='load images one at a time')
+    parser.add_argument('--pixmap', action='store_true',
+                        help='also time QPixmap conversion, needs an X display (or xvfb-run)')
+    parser.add_argument('--output', help='write JSON here instead of stdout')
+
+def _startQt(pixmaps):
+    from PySide.QtGui import QApplication
+    # pixmaps need a GUI application, which Qt 4 only runs on a display,
+    # QImages do not
+    return QApplication(sys.argv, pixmaps)
+
+def _generate(args, path, storeType):
+    from benchmark import SyntheticStore
+    return SyntheticStore.generate(path, width=args.width, height=args.height,
+                                   times=args.times, phis=args.phis,
+                                   thetas=args.thetas, layers=args.layers,
+                                   fields=args.fields.split(','),
+                                   storeType=storeType)
+
+def _benchmark(args, filename):
+    import StoreIndex
+    import StoreLoader
+    from benchmark import RenderBenchmark
+
+    t0 = time.time()
+    store = StoreLoader.openStore(filename)
+    t1 = time.time()
+    StoreIndex.buildIndex(store).join()
+    t2 = time.time()
+    queries = RenderBenchmark.sweepQueries(store)
+    result = RenderBenchmark.run(store, queries, repeat=args.repeat,
+                                 cold=args.cold, serial=args.serial,
+                                 pixmaps=args.pixmap)
+    result['store'] = filename
+    result['openSeconds'] = t1 - t0
+    result['indexSeconds'] = t2 - t1
+    return result
+
+def _report(args, results):
+    text = json.dumps(results, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+    else:
+        sys.stdout.write(text + '\n')
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmark',
+                                     description='Headless Cinema viewer benchmarks')
+    commands = parser.add_subparsers(dest='command')
+    commands.required = True
+
+    generate = commands.add_parser('generate', help='write a synthetic store')
+    generate.add_argument('path', help='directory to write the store to')
+    generate.add_argument('--store-type', choices=['MFS', 'SFS'], default='MFS')
+    _generateArgs(generate)
+
+    run = commands.add_parser('run', help='benchmark rendering an existing store')
+    run.add_argument('store', help='info.json of the store')
+    _runArgs(run)
+
+    suite = commands.add_parser('suite',
+                                help='generate FileStore and SingleFileStore datasets and benchmark both')
+    _generateArgs(suite)
+    _runArgs(suite)
+    suite.add_argument('--keep', help='generate into this directory and keep it')
+
+    args = parser.parse_args(argv)
+
+    if args.command == 'generate':
+        print(_generate(args, args.path, args.store_type))
+        return 0
+
+    app = _startQt(args.pixmap)
+    if args.command == 'run':
+        _report(args, _benchmark(args, args.store))
+        return 0
+
+    workdir = args.keep or tempfile.mkdtemp(prefix='cinema-benchmark-')
+    try:
+        results = {'config': vars(args), 'results': {}}
+        for storeType in ['MFS', 'SFS']:
+            filename = _generate(args, os.path.join(workdir, storeType), storeType)
+            results['results'][storeType] = _benchmark(args, filename)
+        _report(args, results)
+    finally:
+        if not args.keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,114 @@
+"""
+An in memory stand in for a cinema_python store, with the parts of its
+interface the viewer uses, for tests that need no files or Qt.
+"""
+
+TYPES = {'rgb': 'RGB', 'depth': 'Z', 'value': 'VALUE', 'luminance': 'LUMINANCE'}
+
+def imageKey(query):
+    return tuple(sorted(query.items()))
+
+class Document(object):
+    def __init__(self, descriptor, data):
+        self.descriptor = descriptor
+        self.data = data
+
+class FakeStore(object):
+    """
+    parameter_list and parameter_associations as in a store's info.json.
+    images maps imageKey(query) to the array find returns for query.
+    """
+    def __init__(self, parameter_list, parameter_associations=None, images=None):
+        self.parameter_list = parameter_list
+        self.parameter_associations = parameter_associations or {}
+        self.images = images if images is not None else {}
+        self.finds = 0
+
+    def isdepender(self, name):
+        return name in self.parameter_associations
+
+    def getdependers(self, name):
+        return [depender for depender in sorted(self.parameter_associations)
+                if name in self.parameter_associations[depender]]
+
+    def getdependees(self, name):
+        return self.parameter_associations.get(name, {})
+
+    def dependencies_satisfied(self, name, query):
+        for dependee, values in self.getdependees(name).items():
+            if dependee not in query:
+                return False
+            if not self.dependencies_satisfied(dependee, query):
+                return False
+            if query[dependee] not in values:
+                return False
+        return True
+
+    def islayer(self, name):
+        return self.parameter_list[name].get('role') == 'layer'
+
+    def isfield(self, name):
+        return self.parameter_list[name].get('role') == 'field'
+
+    def determine_type(self, descriptor):
+        for name, value in descriptor.items():
+            properties = self.parameter_list.get(name, {})
+            if 'types' in properties:
+                return TYPES[properties['types'][properties['values'].index(value)]]
+        return 'RGB'
+
+    def find(self, query):
+        self.finds += 1
+        data = self.images.get(imageKey(query))
+        if data is not None:
+            yield Document(query, data)
+
+def randomStore(rng, fieldsOnLeaves=True):
+    """
+    A store with a random structure of layers, sublayers depending on
+    values of other layers and fields, drawn from the random.Random rng.
+    Unless fieldsOnLeaves, fields may depend on layers that have sublayers
+    too, which then inherit the field's queries when layers are built.
+    """
+    parameters = {}
+    associations = {}
+    def add(name, values, **properties):
+        properties.update(type='option', values=values, default=values[0])
+        parameters[name] = properties
+
+    for name in ['time', 'phi'][:rng.randint(1, 2)]:
+        parameters[name] = {'type': 'range', 'values': list(range(rng.randint(1, 3))),
+                            'default': 0}
+    if rng.random() < 0.2:
+        return FakeStore(parameters)
+
+    layers = []
+    for i in range(rng.randint(1, 4)):
+        name = 'layer%d' % i
+        add(name, ['%s_%d' % (name, j) for j in range(rng.randint(1, 3))], role='layer')
+        if layers and rng.random() < 0.5:
+            parent = rng.choice(layers)
+            values = parameters[parent]['values']
+            associations[name] = {parent: rng.sample(values, rng.randint(1, len(values)))}
+        layers.append(name)
+    parents = set(next(iter(associations[l])) for l in associations)
+    for i, layer in enumerate(layers):
+        if rng.random() < 0.2 or (fieldsOnLeaves and layer in parents):
+            continue
+        name = 'field%d' % i
+        types = rng.sample(sorted(TYPES), rng.randint(1, len(TYPES)))
+        add(name, ['%s_%s' % (name, t) for t in types], role='field', types=types)
+        values = parameters[layer]['values']
+        associations[name] = {layer: rng.sample(values, rng.randint(1, len(values)))}
+    return FakeStore(parameters, associations)
+
+def randomQuery(store, rng):
+    """ random choices for every parameter, one value of those that take one """
+    query = {}
+    for name, properties in store.parameter_list.items():
+        values = properties['values']
+        if properties['type'] == 'option':
+            query[name] = set(rng.sample(values, rng.randint(1, len(values))))
+        else:
+            query[name] = set([rng.choice(values)])
+    return query
@@ -0,0 +1,72 @@
+"""
+Incremental compositing, when layers are toggled one at a time, against
+compositing from scratch.
+"""
+
+import os
+import random
+import sys
+import unittest
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import Compositor
+
+class CountingCompositor(Compositor.Compositor):
+    """ counts the frames made incrementally """
+    def __init__(self):
+        super(CountingCompositor, self).__init__()
+        self.incremental = 0
+
+    def _add(self, layers, index):
+        self.incremental += 1
+        super(CountingCompositor, self)._add(layers, index)
+
+    def _remove(self, layers, previous, index):
+        self.incremental += 1
+        super(CountingCompositor, self)._remove(layers, previous, index)
+
+class CompositorTest(unittest.TestCase):
+    def _layers(self, rng, count, depthShape):
+        # few distinct depths, so that layers are often equally near
+        return [(rng.randint(0, 256, (6, 5, 3)).astype(np.uint8),
+                 rng.randint(0, 3, depthShape).astype(np.float32))
+                for i in range(count)]
+
+    def _check(self, depthShape, trials):
+        rng = np.random.RandomState(1)
+        choices = random.Random(1)
+        incremental = 0
+        for trial in range(trials):
+            pool = self._layers(rng, choices.randint(1, 7), depthShape)
+            shown = sorted(choices.sample(range(len(pool)), choices.randint(1, len(pool))))
+            compositor = CountingCompositor()
+            for step in range(10):
+                layers = [pool[i] for i in shown]
+                result = compositor.composite([c for c, d in layers],
+                                              [d for c, d in layers])
+                expected = Compositor.Compositor().composite([c for c, d in layers],
+                                                             [d for c, d in layers])
+                self.assertTrue(np.array_equal(result, expected),
+                                'trial %d step %d, layers %s' % (trial, step, shown))
+
+                # toggle one layer, keeping at least one
+                hidden = [i for i in range(len(pool)) if i not in shown]
+                if hidden and (len(shown) == 1 or choices.random() < 0.5):
+                    shown = sorted(shown + [choices.choice(hidden)])
+                elif len(shown) > 1:
+                    shown.remove(choices.choice(shown))
+            incremental += compositor.incremental
+        return incremental
+
+    def testToggleLayers(self):
+        self.assertTrue(self._check((6, 5), 300) > 0)
+
+    def testToggleLayersWithDepthComponents(self):
+        # composited from scratch every time, but must agree all the same
+        self.assertEqual(self._check((6, 5, 2), 50), 0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,45 @@
+"""
+DependencyTable against checking every combination of the chosen values
+with the store, as the viewer did before it.
+"""
+
+import itertools
+import os
+import random
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import DependencyTable
+from FakeStore import randomQuery, randomStore
+
+def productSatisfied(store, name, currentQuery):
+    params = list(currentQuery.keys())
+    for values in itertools.product(*[currentQuery[p] for p in params]):
+        if store.dependencies_satisfied(name, dict(zip(params, values))):
+            return True
+    return False
+
+class DependencyTableTest(unittest.TestCase):
+    def testSatisfied(self):
+        rng = random.Random(4)
+        checked = 0
+        for i in range(100):
+            store = randomStore(rng, fieldsOnLeaves=False)
+            table = DependencyTable.DependencyTable(store)
+            for j in range(5):
+                query = randomQuery(store, rng)
+                states = table.update(query)
+                self.assertEqual(set(states), set(store.parameter_associations))
+                for name in store.parameter_list:
+                    expected = productSatisfied(store, name, query)
+                    self.assertEqual(table.isSatisfied(name, query), expected,
+                                     'store %d %s %s' % (i, name, query))
+                    if name in states:
+                        self.assertEqual(states[name], expected)
+                        checked += 1
+        self.assertTrue(checked > 0)
+
+if __name__ == '__main__':
+    unittest.main()
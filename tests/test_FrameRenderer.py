@@ -0,0 +1,69 @@
+"""
+Previews, composited from reduced copies of the images, against the
+refined frame.
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import FrameRenderer
+import ImageCache
+import LayerLoader
+import Sidecars
+import StoreIndex
+from FakeStore import FakeStore, imageKey
+
+class PreviewTest(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.RandomState(0)
+        self.store = FakeStore(
+            {'time': {'type': 'range', 'values': [0], 'default': 0},
+             'vis': {'type': 'option', 'role': 'layer', 'values': ['a', 'b'],
+                     'default': 'a'},
+             'color': {'type': 'hidden', 'role': 'field', 'values': ['depth', 'value'],
+                       'types': ['depth', 'value'], 'default': 'value'}},
+            {'color': {'vis': ['a', 'b']}})
+        for vis in ['a', 'b']:
+            depth = rng.rand(9, 12).astype(np.float32)
+            values = rng.rand(9, 12).astype(np.float32)
+            # extremes only at pixels previews leave out
+            values[1, 3] = 10.0
+            values[5, 7] = -10.0
+            base = {'time': 0, 'vis': vis}
+            self.store.images[imageKey(dict(base, color='depth'))] = depth
+            self.store.images[imageKey(dict(base, color='value'))] = values
+        self.query = {'time': set([0]), 'vis': set(['a', 'b']),
+                      'color': set(['value'])}
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def _render(self, stride):
+        loader = LayerLoader.LayerLoader(serial=True, cache=ImageCache.ImageCache())
+        renderer = FrameRenderer.FrameRenderer(self.store, loader)
+        return np.array(renderer.render(self.query, stride))
+
+    def testPreviewFromFullImages(self):
+        full = self._render(1)
+        self.assertTrue(np.array_equal(self._render(2), full[::2, ::2]))
+
+    def testPreviewFromSidecars(self):
+        full = self._render(1)
+        filename = os.path.join(self.directory, 'info.json')
+        Sidecars.convert(self.store, filename, StoreIndex.find)
+        Sidecars.attach(self.store, filename)
+        self.store.finds = 0
+        preview = self._render(2)
+        self.assertEqual(self.store.finds, 0)
+        self.assertTrue(np.array_equal(preview, full[::2, ::2]))
+
+if __name__ == '__main__':
+    unittest.main()
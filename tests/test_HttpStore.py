@@ -0,0 +1,142 @@
+"""
+Reads a store directory served by the standard library's web server.
+
+Run from the top of the repository with
+    python -m unittest discover tests
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import unittest
+
+try:
+    from http.server import HTTPServer, SimpleHTTPRequestHandler
+    from socketserver import ThreadingMixIn
+except ImportError:
+    from BaseHTTPServer import HTTPServer
+    from SimpleHTTPServer import SimpleHTTPRequestHandler
+    from SocketServer import ThreadingMixIn
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import HttpStore
+import PackedStore
+
+class _Server(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+def _handlerFor(root, requests):
+    class Handler(SimpleHTTPRequestHandler):
+        # keep-alive, and no support for Range headers
+        protocol_version = 'HTTP/1.1'
+
+        def translate_path(self, path):
+            requests.append((path, self.headers.get('Range')))
+            path = path.split('?', 1)[0].lstrip('/')
+            return os.path.join(root, *path.split('/'))
+
+        def log_message(self, *args):
+            pass
+    return Handler
+
+class HttpStoreTest(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.cache = tempfile.mkdtemp()
+        os.makedirs(os.path.join(self.root, 'images', 'a'))
+        self.files = {}
+        for i in range(20):
+            name = 'images/a/%d.png' % i
+            self._write(name, os.urandom(1000 + i))
+        self._write('info.json', b'{}')
+        self._write(PackedStore.DIRECTORY + '/data-000.pack', bytes(bytearray(range(256))))
+
+        self.requests = []
+        self.server = _Server(('127.0.0.1', 0), _handlerFor(self.root, self.requests))
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        url = 'http://127.0.0.1:%d/info.json' % self.server.server_address[1]
+        self.remote = HttpStore.RemoteStore(url, self.cache)
+
+    def tearDown(self):
+        self.remote.close()
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.root)
+        shutil.rmtree(self.cache)
+
+    def _write(self, name, contents):
+        filename = os.path.join(self.root, *name.split('/'))
+        directory = os.path.dirname(filename)
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        with open(filename, 'wb') as f:
+            f.write(contents)
+        self.files[name] = contents
+
+    def testGet(self):
+        name = 'images/a/3.png'
+        self.assertEqual(self.remote.get(name), self.files[name])
+
+    def testFetchMirrorsOnce(self):
+        name = 'images/a/4.png'
+        filename = self.remote.fetch(name)
+        self.assertTrue(filename.startswith(self.remote.getMirror()))
+        with open(filename, 'rb') as f:
+            self.assertEqual(f.read(), self.files[name])
+        count = len(self.requests)
+        self.assertEqual(self.remote.fetch(name), filename)
+        self.assertEqual(len(self.requests), count)
+
+    def testMissingFile(self):
+        self.assertRaises(IOError, self.remote.get, 'images/missing.png')
+        self.assertRaises(IOError, self.remote.fetch, 'images/missing.png')
+        self.assertFalse(os.path.exists(self.remote.localPath('images/missing.png')))
+
+    def testConnectionsAreReused(self):
+        connections = []
+        pool = self.remote._pool
+        connect = pool._connect
+        def counting():
+            connection = connect()
+            connections.append(connection)
+            return connection
+        pool._connect = counting
+
+        names = sorted(n for n in self.files if n.startswith('images/'))
+        results = {}
+        def work(index):
+            for name in names:
+                results[(index, name)] = self.remote.get(name)
+        threads = [threading.Thread(target=work, args=(i,)) for i in range(16)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        for (index, name), contents in results.items():
+            self.assertEqual(contents, self.files[name])
+        self.assertEqual(len(results), 16 * len(names))
+        self.assertTrue(0 < len(connections) <= HttpStore.CONNECTIONS)
+
+    def testRangeFallback(self):
+        name = PackedStore.DIRECTORY + '/data-000.pack'
+        reader = HttpStore.RangeReader(self.remote, name)
+        try:
+            self.assertEqual(reader.readAt(10, 5), self.files[name][10:15])
+            # the server sent the whole container, which is now mirrored
+            self.assertEqual(self.requests[-1][1], 'bytes=10-14')
+            with open(self.remote.localPath(name), 'rb') as f:
+                self.assertEqual(f.read(), self.files[name])
+            count = len(self.requests)
+            self.assertEqual(reader.readAt(200, 56), self.files[name][200:])
+            self.assertEqual(len(self.requests), count)
+        finally:
+            reader.close()
+
+if __name__ == '__main__':
+    unittest.main()
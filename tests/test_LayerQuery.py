@@ -0,0 +1,109 @@
+"""
+The compiled QueryPlan against the recursive layer builder it replaced, on
+random stores and choices.
+"""
+
+import copy
+import itertools
+import os
+import random
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import LayerQuery
+import LayerSpec
+from FakeStore import randomQuery, randomStore
+
+# The builder before QueryPlan, asking the store about every parameter
+def _fieldsFor(store, currentQuery, n):
+    param = store.parameter_list[n]
+    chosen = []
+    for i, v in enumerate(param['values']):
+        if v in currentQuery[n] or ('types' in param and param['types'][i] == 'depth'):
+            chosen.append(v)
+    return chosen
+
+def _buildQueryFor(store, currentQuery, n, query, layers):
+    if not store.dependencies_satisfied(n, query.dict):
+        return
+    if store.isfield(n):
+        for c in _fieldsFor(store, currentQuery, n):
+            query.addQuery(store.determine_type({n: c}), n, c)
+        layers.append(query)
+        return
+    for v in currentQuery[n]:
+        lquery = copy.deepcopy(query)
+        lquery.addToBaseQuery({n: v})
+        for d in store.getdependers(n):
+            _buildQueryFor(store, currentQuery, d, lquery, layers)
+
+def recursiveBuildLayers(store, currentQuery):
+    base = LayerSpec.LayerSpec()
+    potentials = []
+    for name in store.parameter_list.keys():
+        if not store.isdepender(name) and not store.islayer(name):
+            base.addToBaseQuery({name: next(iter(currentQuery[name]))})
+        else:
+            potentials.append(name)
+    layers = []
+    hasLayer = False
+    for name in potentials:
+        if store.islayer(name) and not store.isdepender(name):
+            hasLayer = True
+            _buildQueryFor(store, currentQuery, name, base, layers)
+    if not hasLayer:
+        layers.append(base)
+    return layers, hasLayer
+
+def productFieldQueries(store):
+    """ field queries of buildLayers over every combination of choices """
+    dd = store.parameter_list
+    everything = dict((name, set(dd[name]['values'])) for name in dd)
+    single = [name for name in sorted(dd)
+              if store.isfield(name) or
+              (not store.isdepender(name) and not store.islayer(name))]
+    queries = set()
+    for values in itertools.product(*[dd[name]['values'] for name in single]):
+        currentQuery = dict(everything)
+        for name, value in zip(single, values):
+            currentQuery[name] = set([value])
+        for layer in recursiveBuildLayers(store, currentQuery)[0]:
+            for img_type, query in layer.getQueries():
+                queries.add((img_type, tuple(sorted(query.items()))))
+    return queries
+
+def describe(layers):
+    return [(sorted(l.dict.items()),
+             sorted((t, sorted(q.items())) for t, q in l.getQueries()))
+            for l in layers]
+
+class QueryPlanTest(unittest.TestCase):
+    def testBuildLayers(self):
+        rng = random.Random(2)
+        for i in range(200):
+            store = randomStore(rng, fieldsOnLeaves=False)
+            plan = LayerQuery.QueryPlan(store)
+            for j in range(10):
+                query = randomQuery(store, rng)
+                layers, hasLayer = plan.buildLayers(query)
+                expected, expectedHasLayer = recursiveBuildLayers(store, query)
+                self.assertEqual(hasLayer, expectedHasLayer)
+                self.assertEqual(describe(layers), describe(expected),
+                                 'store %d query %s' % (i, query))
+
+    def testFieldQueries(self):
+        # a field next to sublayers leaves its queries on their layers, for
+        # files that are not in the store, so only stores with fields on
+        # leaf layers are compared
+        rng = random.Random(3)
+        for i in range(200):
+            store = randomStore(rng)
+            queries = [(img_type, tuple(sorted(query.items())))
+                       for img_type, query in LayerQuery.allFieldQueries(store)]
+            self.assertEqual(len(queries), len(set(queries)), 'store %d' % i)
+            self.assertEqual(set(queries), productFieldQueries(store), 'store %d' % i)
+
+if __name__ == '__main__':
+    unittest.main()